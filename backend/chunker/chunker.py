@@ -1,13 +1,25 @@
 """Chunking engine for messages."""
 
+import asyncio
 import hashlib
 import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
-from datetime import datetime, timezone
-from typing import AsyncGenerator
+from functools import lru_cache, partial
+from typing import AsyncGenerator, NamedTuple
+
+import aiosqlite
+import numpy as np
 
 from config import settings
-from db.database import get_connection
+from db.database import _write_lock, get_connection
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -17,6 +29,24 @@ GAP_HARD_SECONDS = 4 * 60 * 60  # 4 hours
 GAP_SOFT_SECONDS = 20 * 60  # 20 minutes
 CHUNK_MIN_TOKENS = 300  # Kept for backward compatibility; chunk_target setting takes precedence
 
+# Stay under SQLite's default 999 bound-parameter limit for IN lookups
+_ID_LOOKUP_BATCH = 900
+
+# chunk_chat is pure CPU work, so chats are chunked in worker processes
+_chunk_pool: ProcessPoolExecutor | None = None
+
+
+class Msg(NamedTuple):
+    """A message row as consumed by the chunker."""
+
+    message_id: str
+    chat_id: str
+    chat_name: str | None
+    sender_id: str
+    sender_name: str
+    text: str | None
+    timestamp: int
+
 
 @dataclass
 class Chunk:
@@ -29,6 +59,8 @@ class Chunk:
     message_count: int
     content: str
     content_hash: str
+    # Serialized once at finalization so inserts only bind the string
+    participants_json: str
 
 
 def estimate_tokens(text: str) -> int:
@@ -38,11 +70,29 @@ def estimate_tokens(text: str) -> int:
     return int(len(text.split()) * 1.35)
 
 
+@lru_cache(maxsize=8192)
+def _format_ts_minute(ts_minute: int) -> str:
+    """Format an epoch minute as "%Y-%m-%d %H:%M" (UTC).
+
+    Keyed on the minute because the format drops seconds, so adjacent
+    messages in a conversation mostly hit the cache.
+    """
+    tm = time.gmtime(ts_minute * 60)
+    return (
+        f"{tm.tm_year:04d}-{tm.tm_mon:02d}-{tm.tm_mday:02d} "
+        f"{tm.tm_hour:02d}:{tm.tm_min:02d}"
+    )
+
+
+@lru_cache(maxsize=16384)
+def _format_prefix(ts_minute: int, sender_name: str) -> str:
+    """Build the "[timestamp] Sender: " prefix shared by a sender's messages within a minute."""
+    return f"[{_format_ts_minute(ts_minute)}] {sender_name}: "
+
+
 def format_message(timestamp: int, sender_name: str, text: str) -> str:
     """Format a single message as [timestamp] Sender: message."""
-    dt = datetime.fromtimestamp(timestamp, tz=timezone.utc)
-    date_str = dt.strftime("%Y-%m-%d %H:%M")
-    return f"[{date_str}] {sender_name}: {text}"
+    return f"{_format_prefix(timestamp // 60, sender_name)}{text}"
 
 
 def compute_content_hash(content: str) -> str:
@@ -50,188 +100,305 @@ def compute_content_hash(content: str) -> str:
     return hashlib.sha256(content.encode("utf-8")).hexdigest()
 
 
-async def get_unembedded_messages() -> dict[str, list[dict]]:
-    """Fetch all messages that haven't been embedded yet, grouped by chat_id.
-    Only includes messages from chats where included=1.
+async def stream_unembedded_messages() -> AsyncGenerator[tuple[str, list[Msg]], None]:
+    """Yield ``(chat_id, messages)`` for each chat with messages not yet chunked.
+
+    Only includes messages from chats where included=1. Rows arrive ordered
+    by chat_id, so each chat is emitted as soon as the next chat's first row
+    is read rather than after the whole result set has been materialized.
     """
-    from db.database import fetch_all
-    
-    rows = await fetch_all(
-        """
-        SELECT m.id, m.message_id, m.chat_id, m.chat_name, m.sender_id, m.sender_name, m.text, m.timestamp
-        FROM messages m
-        JOIN chats c ON m.chat_id = c.chat_id
-        WHERE (c.included = 1)
-        AND m.timestamp > IFNULL(c.last_chunked_at, 0)
-        ORDER BY m.chat_id, m.timestamp ASC
-        """
-    )
+    db = await get_connection()
+    try:
+        chat_id: str | None = None
+        messages: list[Msg] = []
+        async with db.execute(
+            """
+            SELECT m.message_id, m.chat_id, m.chat_name, m.sender_id, m.sender_name, m.text, m.timestamp
+            FROM messages m
+            JOIN chats c ON m.chat_id = c.chat_id
+            WHERE (c.included = 1)
+            AND m.timestamp > IFNULL(c.last_chunked_at, 0)
+            ORDER BY m.chat_id, m.timestamp ASC
+            """
+        ) as cursor:
+            # The id columns have TEXT affinity, so SQLite already returns
+            # them as str; rows are unpacked positionally rather than through
+            # a keyed row factory.
+            async for (
+                message_id,
+                row_chat_id,
+                chat_name,
+                sender_id,
+                sender_name,
+                text,
+                timestamp,
+            ) in cursor:
+                if row_chat_id != chat_id:
+                    if messages:
+                        yield chat_id, messages
+                    chat_id = sys.intern(row_chat_id)
+                    messages = []
+
+                # Intern the strings repeated across a chat's messages so they
+                # share one object instead of each row holding its own copy
+                if chat_name is not None:
+                    chat_name = sys.intern(chat_name)
+
+                messages.append(
+                    Msg(
+                        message_id,
+                        chat_id,
+                        chat_name,
+                        sender_id or "",
+                        sys.intern(sender_name or "Unknown"),
+                        text,
+                        timestamp,
+                    )
+                )
 
-    # Group by chat_id
-    chats: dict[str, list[dict]] = {}
-    for row in rows:
-        chat_id = str(row["chat_id"])
-        if chat_id not in chats:
-            chats[chat_id] = []
-
-        chats[chat_id].append(
-            {
-                "message_id": str(row["message_id"]),
-                "chat_id": chat_id,
-                "chat_name": row["chat_name"],
-                "sender_id": str(row["sender_id"]) if row["sender_id"] else "",
-                "sender_name": row["sender_name"] or "Unknown",
-                "text": row["text"],
-                "timestamp": row["timestamp"],
-            }
-        )
+        if messages:
+            yield chat_id, messages
+    finally:
+        await db.close()
 
-    return chats
 
+def parse_noise_keywords(raw: str) -> list[str]:
+    """Split the comma-separated noise filter setting into lowercase keywords."""
+    return [k.strip().lower() for k in raw.split(",") if k.strip()]
 
-def chunk_chat(messages: list[dict]) -> list[Chunk]:
-    """Chunk a single chat's messages according to the algorithm."""
-    if not messages:
+
+def _plan_spans(
+    timestamps: list[int],
+    token_counts: list[int],
+    chunk_target: int,
+    chunk_max: int,
+    chunk_overlap: int,
+) -> list[tuple[int, int]]:
+    """Decide chunk boundaries as half-open ``(start, end)`` message spans.
+
+    Gaps and running token totals are computed with NumPy up front, so the
+    Python loop only visits gap candidates and max-token splits rather than
+    every message. Consecutive spans overlap when a chunk is split at
+    chunk_max and messages are carried over.
+    """
+    n = len(timestamps)
+    if not n:
         return []
 
-    chunks: list[Chunk] = []
-    current_chunk_messages: list[dict] = []
-    current_chunk_start_timestamp: int = 0
+    # cum[k] is the token total of messages [0, k), so any span's total is a
+    # difference of two entries
+    cum_arr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.asarray(token_counts, dtype=np.int64), out=cum_arr[1:])
+    deltas = np.diff(np.asarray(timestamps, dtype=np.int64))
+    gap_idx = np.flatnonzero(deltas > GAP_SOFT_SECONDS)
+    # A gap before message j is a candidate break; hard ones always split
+    gaps = (gap_idx + 1).tolist()
+    hard = (deltas[gap_idx] > GAP_HARD_SECONDS).tolist()
+    cum = cum_arr.tolist()
+
+    spans: list[tuple[int, int]] = []
+    start = 0  # first message of the current chunk
+    pos = 1  # next message to be appended to it
+    g = 0
+
+    while pos < n:
+        while g < len(gaps) and gaps[g] < pos:
+            g += 1
+        gap = gaps[g] if g < len(gaps) else n
+
+        # First message at which the chunk reaches chunk_max once appended
+        limit = max(bisect_left(cum, cum[start] + chunk_max) - 1, pos)
+
+        if gap < n and gap <= limit:
+            g += 1
+            # Hard break (4+ hours gap), or soft break (20+ minutes gap) once
+            # the current chunk has reached the target size
+            if hard[g - 1] or cum[gap] - cum[start] >= chunk_target:
+                spans.append((start, gap))
+                start = gap
+                pos = gap + 1
+                continue
+            if gap < limit:
+                pos = gap + 1
+                continue
+            # The gap message itself pushes the chunk over chunk_max
+
+        if limit >= n:
+            break
+
+        # Hard max token limit reached at message `limit`
+        split_point = start + (limit + 1 - start) // 2
+        spans.append((start, split_point))
+
+        # Carry overlap: walk back from the end of the first half until the
+        # cumulative tokens exceed chunk_overlap, then keep everything from
+        # there onwards as the start of the next chunk
+        overlap_start = split_point
+        overlap_tokens = 0
+        while overlap_start > start:
+            t = token_counts[overlap_start - 1]
+            if overlap_tokens + t > chunk_overlap:
+                break
+            overlap_start -= 1
+            overlap_tokens += t
+
+        start = overlap_start
+        pos = limit + 1
+
+    spans.append((start, n))
+    return spans
+
+
+def chunk_chat(
+    messages: list[Msg],
+    chunk_target: int | None = None,
+    chunk_max: int | None = None,
+    chunk_overlap: int | None = None,
+    noise_keywords: list[str] | None = None,
+) -> list[Chunk]:
+    """Chunk a single chat's messages according to the algorithm.
+
+    Thresholds default to the current settings. Pass them explicitly when
+    running in a worker process, where the global settings may be stale.
+    """
+    if not messages:
+        return []
 
-    def finalize_chunk(msgs: list[dict]) -> Chunk | None:
-        """Create a Chunk from a list of messages."""
+    if chunk_target is None:
+        chunk_target = settings.chunk_target
+    if chunk_max is None:
+        chunk_max = settings.chunk_max
+    if chunk_overlap is None:
+        chunk_overlap = settings.chunk_overlap
+    if noise_keywords is None:
+        noise_keywords = parse_noise_keywords(settings.noise_filter_keywords)
+
+    def finalize_chunk(msgs: list[Msg], formatted_lines: list[str]) -> Chunk | None:
+        """Create a Chunk from a list of messages and their formatted lines."""
         if not msgs:
             return None
 
-        # Get unique participants
-        participants = list(
-            set(msg["sender_name"] for msg in msgs if msg["sender_name"])
-        )
-
-        # Build content
-        content_parts = []
-        for msg in msgs:
-            content_parts.append(
-                format_message(msg["timestamp"], msg["sender_name"], msg["text"])
-            )
-        content = "\n".join(content_parts)
+        # Get unique participants in first-seen order
+        participants = list(dict.fromkeys(m.sender_name for m in msgs if m.sender_name))
 
-        # Compute stable hash
-        content_hash = hashlib.sha256(content.encode()).hexdigest()[:16]
+        # Build content from the lines formatted once up front
+        content = "\n".join(formatted_lines)
 
-        # Compute stable chunk ID from content and chat
-        chunk_id = hashlib.sha256(f"{msgs[0]['chat_id']}:{content_hash}".encode()).hexdigest()[:20]
+        # Compute the stable content hash and chunk ID from a single pass over
+        # chat_id + content: the first 16 hex chars are the content hash, the
+        # next 20 the chunk ID. blake2b emits exactly the 18 bytes we keep.
+        h = hashlib.blake2b(digest_size=18)
+        h.update(str(msgs[0].chat_id).encode())
+        h.update(b":")
+        h.update(content.encode())
+        digest = h.hexdigest()
+        content_hash = digest[:16]
+        chunk_id = digest[16:]
 
         return Chunk(
             chunk_id=chunk_id,
-            chat_id=msgs[0]["chat_id"],
-            chat_name=msgs[0]["chat_name"],
+            chat_id=msgs[0].chat_id,
+            chat_name=msgs[0].chat_name,
             participants=participants,
-            timestamp_start=msgs[0]["timestamp"],
-            timestamp_end=msgs[-1]["timestamp"],
+            timestamp_start=msgs[0].timestamp,
+            timestamp_end=msgs[-1].timestamp,
             message_count=len(msgs),
             content=content,
             content_hash=content_hash,
+            participants_json=json.dumps(
+                participants, ensure_ascii=False, separators=(",", ":")
+            ),
         )
 
-    def get_current_token_count() -> int:
-        """Get token count of current chunk content."""
-        if not current_chunk_messages:
-            return 0
-        content = "\n".join(
-            format_message(m["timestamp"], m["sender_name"], m["text"])
-            for m in current_chunk_messages
-        )
-        return estimate_tokens(content)
-
-    # Process noise keywords
-    noise_keywords = [
-        k.strip().lower() for k in settings.noise_filter_keywords.split(",") if k.strip()
-    ]
+    # Compile noise keywords into a single alternation so each message is
+    # scanned once rather than once per keyword
+    noise_re = (
+        re.compile("|".join(re.escape(k) for k in noise_keywords))
+        if noise_keywords
+        else None
+    )
 
-    for i, msg in enumerate(messages):
+    kept: list[Msg] = []
+    for msg in messages:
         # Noise filter
-        if noise_keywords:
-            msg_text_lower = (msg["text"] or "").lower()
-            if any(keyword in msg_text_lower for keyword in noise_keywords):
-                logger.debug(f"Skipping noisy message in {msg['chat_name']}")
-                continue
-
-        if not current_chunk_messages:
-            # Start new chunk
-            current_chunk_messages.append(msg)
-            current_chunk_start_timestamp = msg["timestamp"]
+        if noise_re is not None and noise_re.search((msg.text or "").lower()):
+            logger.debug(f"Skipping noisy message in {msg.chat_name}")
             continue
+        kept.append(msg)
+
+    # Format and estimate each message exactly once, then plan boundaries on
+    # plain integer lists. The prefix cache is bound locally to skip the
+    # global lookup per message.
+    prefix = _format_prefix
+    formatted = [f"{prefix(m.timestamp // 60, m.sender_name)}{m.text}" for m in kept]
+    spans = _plan_spans(
+        [m.timestamp for m in kept],
+        [estimate_tokens(f) for f in formatted],
+        chunk_target,
+        chunk_max,
+        chunk_overlap,
+    )
 
-        last_msg = current_chunk_messages[-1]
-        delta = msg["timestamp"] - last_msg["timestamp"]
+    chunks: list[Chunk] = []
+    for start, end in spans:
+        chunk = finalize_chunk(kept[start:end], formatted[start:end])
+        if chunk:
+            chunks.append(chunk)
 
-        # Check for hard break (4+ hours gap)
-        if delta > GAP_HARD_SECONDS:
-            # Finalize current chunk
-            chunk = finalize_chunk(current_chunk_messages)
-            if chunk:
-                chunks.append(chunk)
+    return chunks
 
-            # Start new chunk
-            current_chunk_messages = [msg]
-            current_chunk_start_timestamp = msg["timestamp"]
-            continue
 
-        # Check for soft break (20+ minutes gap)
-        if delta > GAP_SOFT_SECONDS:
-            current_tokens = get_current_token_count()
-            if current_tokens >= settings.chunk_target:
-                # Finalize current chunk and start new
-                chunk = finalize_chunk(current_chunk_messages)
-                if chunk:
-                    chunks.append(chunk)
-
-                current_chunk_messages = [msg]
-                current_chunk_start_timestamp = msg["timestamp"]
-                continue
+async def _existing_chunk_ids(
+    db: aiosqlite.Connection, chunk_ids: list[str]
+) -> set[str]:
+    """Return the subset of chunk_ids already stored in the chunks table."""
+    existing: set[str] = set()
+    for i in range(0, len(chunk_ids), _ID_LOOKUP_BATCH):
+        batch = chunk_ids[i : i + _ID_LOOKUP_BATCH]
+        placeholders = ",".join("?" * len(batch))
+        cursor = await db.execute(
+            f"SELECT chunk_id FROM chunks WHERE chunk_id IN ({placeholders})",
+            tuple(batch),
+        )
+        existing.update(row[0] for row in await cursor.fetchall())
+    return existing
 
-        # No break - append to current chunk
-        current_chunk_messages.append(msg)
-
-        # Check for hard max token limit
-        current_tokens = get_current_token_count()
-        if current_tokens >= settings.chunk_max:
-            split_point = len(current_chunk_messages) // 2
-            first_half = current_chunk_messages[:split_point]
-            second_half = current_chunk_messages[split_point:]
-
-            chunk = finalize_chunk(first_half)
-            if chunk:
-                chunks.append(chunk)
-
-            # Carry overlap: take messages from the end of first_half until their
-            # cumulative tokens exceed chunk_overlap, then prepend to second_half
-            overlap_msgs: list[dict] = []
-            overlap_tokens = 0
-            for om in reversed(first_half):
-                t = estimate_tokens(
-                    format_message(om["timestamp"], om["sender_name"], om["text"])
-                )
-                if overlap_tokens + t > settings.chunk_overlap:
-                    break
-                overlap_msgs.insert(0, om)
-                overlap_tokens += t
-
-            current_chunk_messages = overlap_msgs + second_half
-            current_chunk_start_timestamp = (
-                current_chunk_messages[0]["timestamp"]
-                if current_chunk_messages
-                else msg["timestamp"]
+
+def _get_chunk_pool() -> ProcessPoolExecutor | None:
+    """Lazily create the process pool used for chunking.
+
+    Returns None when processes can't be spawned, in which case callers fall
+    back to the event loop's default thread executor.
+    """
+    global _chunk_pool
+    if _chunk_pool is None:
+        try:
+            # spawn, not fork: forking a process that runs aiosqlite and
+            # httpx threads can copy locks held by those threads
+            _chunk_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn"),
             )
+        except (OSError, NotImplementedError) as e:
+            logger.warning(f"Process pool unavailable, chunking in a thread: {e}")
+            return None
+    return _chunk_pool
 
-    # Finalize last chunk
-    if current_chunk_messages:
-        chunk = finalize_chunk(current_chunk_messages)
-        if chunk:
-            chunks.append(chunk)
 
-    return chunks
+def _discard_chunk_pool(pool: ProcessPoolExecutor | None) -> None:
+    """Drop a broken pool so the next run starts a fresh one."""
+    global _chunk_pool
+    if pool is not None and _chunk_pool is pool:
+        _chunk_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_chunk_pool() -> None:
+    """Shut down the chunking process pool, if one was started."""
+    global _chunk_pool
+    if _chunk_pool is not None:
+        pool, _chunk_pool = _chunk_pool, None
+        pool.shutdown(wait=False, cancel_futures=True)
 
 
 async def chunk_messages_streaming() -> AsyncGenerator[dict, None]:
@@ -240,93 +407,128 @@ async def chunk_messages_streaming() -> AsyncGenerator[dict, None]:
     """
     logger.info("Starting message chunking (streaming)...")
 
-    chats = await get_unembedded_messages()
-
-    if not chats:
-        yield {"type": "progress", "stage": "chunk", "message": "No messages to chunk"}
-        yield {"type": "done", "chunks_created": 0}
-        return
-
-    total_chunks = 0
-
-    for chat_id, messages in chats.items():
-        chat_name = messages[0]["chat_name"] if messages else "Unknown"
-        yield {
-            "type": "progress",
-            "stage": "chunk",
-            "message": f"Processing {chat_name}...",
-        }
-
-        chunks = chunk_chat(messages)
-
-        from db.database import get_connection, _write_lock
-        async with _write_lock:
-            db = await get_connection()
+    # Hand each chat to the pool as soon as its rows have been read, so
+    # chunking overlaps the rest of the fetch. Settings are bound now because
+    # worker processes don't see later in-place updates to the global
+    # settings object. Writes wait until the read cursor is closed.
+    loop = asyncio.get_running_loop()
+    pool = _get_chunk_pool()
+    chunk_fn = partial(
+        chunk_chat,
+        chunk_target=settings.chunk_target,
+        chunk_max=settings.chunk_max,
+        chunk_overlap=settings.chunk_overlap,
+        noise_keywords=parse_noise_keywords(settings.noise_filter_keywords),
+    )
+    pending = []
+    try:
+        async for chat_id, messages in stream_unembedded_messages():
             try:
-                for i, chunk in enumerate(chunks):
-                    # Check if this exact chunk already exists. chunk_id is derived
-                    # from chat_id + content_hash (see finalize_chunk above), so this
-                    # is correctly scoped per chat — checking content_hash alone would
-                    # false-positive whenever two different chats produce byte-identical
-                    # formatted content (e.g. the same short reply at the same minute),
-                    # silently dropping the second chat's chunk while its
-                    # last_chunked_at watermark still advances past those messages.
-                    cursor = await db.execute(
-                        "SELECT id FROM chunks WHERE chunk_id = ?",
-                        (chunk.chunk_id,),
-                    )
-                    existing = await cursor.fetchone()
-
-                    if existing:
+                future = loop.run_in_executor(pool, chunk_fn, messages)
+            except BrokenProcessPool:
+                logger.warning("Chunking process pool broke, chunking in a thread")
+                _discard_chunk_pool(pool)
+                pool = None
+                future = loop.run_in_executor(pool, chunk_fn, messages)
+            pending.append((chat_id, messages, future))
+
+        if not pending:
+            yield {"type": "progress", "stage": "chunk", "message": "No messages to chunk"}
+            yield {"type": "done", "chunks_created": 0}
+            return
+
+        total_chunks = 0
+
+        # One connection serves the lookups and writes for every chat in the run
+        db = await get_connection()
+        try:
+            for chat_id, messages, future in pending:
+                chat_name = messages[0].chat_name
+                last_ts = messages[-1].timestamp
+                yield {
+                    "type": "progress",
+                    "stage": "chunk",
+                    "message": f"Processing {chat_name}...",
+                }
+
+                try:
+                    chunks = await future
+                except BrokenProcessPool:
+                    # A worker died (e.g. OOM-killed); redo this chat in a thread
+                    # and let the next run start a fresh pool
+                    logger.warning(f"Chunking process pool broke while chunking {chat_name}")
+                    _discard_chunk_pool(pool)
+                    chunks = await loop.run_in_executor(None, chunk_fn, messages)
+
+                # Look up which of this run's chunk IDs already exist in batched
+                # IN queries against the chunk_id unique index, so memory scales
+                # with the new chunks rather than the chat's history. Rows are
+                # built before taking the write lock so the critical section is
+                # only the INSERT, the watermark UPDATE and the commit.
+                # chunk_id is derived from chat_id + content (see finalize_chunk
+                # above), so this is correctly scoped per chat — checking
+                # content_hash alone would false-positive whenever two different
+                # chats produce byte-identical formatted content (e.g. the same
+                # short reply at the same minute), silently dropping the second
+                # chat's chunk while its last_chunked_at watermark still advances
+                # past those messages.
+                existing_ids = await _existing_chunk_ids(db, [c.chunk_id for c in chunks])
+
+                rows = []
+                for chunk in chunks:
+                    if chunk.chunk_id in existing_ids:
                         continue
-
-                    await db.execute(
-                        """
-                        INSERT INTO chunks (
-                            chunk_id, chat_id, chat_name, participants,
-                            timestamp_start, timestamp_end, message_count,
-                            content, content_hash, embedding_version, embedded_at
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)
-                        """,
+                    existing_ids.add(chunk.chunk_id)
+                    rows.append(
                         (
                             chunk.chunk_id,
                             chunk.chat_id,
                             chunk.chat_name,
-                            json.dumps(chunk.participants),
+                            chunk.participants_json,
                             chunk.timestamp_start,
                             chunk.timestamp_end,
                             chunk.message_count,
                             chunk.content,
                             chunk.content_hash,
                             settings.embedding_model,
-                        ),
+                        )
                     )
-                    total_chunks += 1
-
-                    # Periodic progress within large chats
-                    if i % 50 == 0 and i > 0:
-                        yield {
-                            "type": "progress",
-                            "stage": "chunk",
-                            "message": f"Processing {chat_name}: Created {i} chunks...",
-                        }
-
-                # Update last_chunked_at for this chat so we don't process these messages again
-                if messages:
-                    last_ts = messages[-1]["timestamp"]
+
+                async with _write_lock:
+                    if rows:
+                        # OR IGNORE: the existence check above ran outside the lock
+                        cursor = await db.executemany(
+                            """
+                            INSERT OR IGNORE INTO chunks (
+                                chunk_id, chat_id, chat_name, participants,
+                                timestamp_start, timestamp_end, message_count,
+                                content, content_hash, embedding_version, embedded_at
+                            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)
+                            """,
+                            rows,
+                        )
+                        total_chunks += cursor.rowcount
+
+                    # Update last_chunked_at for this chat so we don't process these messages again
                     await db.execute(
                         "UPDATE chats SET last_chunked_at = ? WHERE chat_id = ?",
                         (last_ts, chat_id)
                     )
 
-                await db.commit()
-            finally:
-                await db.close()
+                    await db.commit()
+
+                yield {
+                    "type": "progress",
+                    "stage": "chunk",
+                    "message": f"Created {len(chunks)} chunks from {chat_name}",
+                }
+        finally:
+            await db.close()
 
-        yield {
-            "type": "progress",
-            "stage": "chunk",
-            "message": f"Created {len(chunks)} chunks from {chat_name}",
-        }
+        yield {"type": "done", "chunks_created": total_chunks}
+    finally:
+        # Don't leave queued chats running if the client went away mid-run
+        for *_, future in pending:
+            if not future.done():
+                future.cancel()
 
-    yield {"type": "done", "chunks_created": total_chunks}
@@ -2,6 +2,8 @@
 
 import time
 from dataclasses import dataclass, fields
+from datetime import datetime
+from functools import lru_cache
 from typing import Any
 
 from db.database import get_connection
@@ -16,6 +18,8 @@ DEFAULTS = {
     "telegram_fetch_wait": "5",
     "ollama_url": "http://ollama:11434",
     "embedding_model": "qwen3-Embedding-0.6B:Q8_0",
+    "embedding_batch_size": "32",
+    "embedding_max_chars_per_batch": "200000",
     "chat_provider": "ollama",
     "chat_model": "qwen3:8b",
     "chat_url": "http://ollama:11434",
@@ -24,6 +28,8 @@ DEFAULTS = {
     "custom_chat_url": "",
     "temperature": "0.2",
     "max_tokens": "4096",
+    "stream_batch_size": "16",
+    "stream_flush_ms": "25",
     "top_k": "15",
     "context_cap": "10000",
     "chunk_target": "1000",
@@ -85,6 +91,8 @@ class Settings:
     telegram_fetch_wait: int = 5
     ollama_url: str = "http://ollama:11434"
     embedding_model: str = "qwen3-Embedding-0.6B:Q8_0"
+    embedding_batch_size: int = 32
+    embedding_max_chars_per_batch: int = 200000
     chat_provider: str = "ollama"
     chat_model: str = "qwen3:8b"
     chat_url: str = "http://ollama:11434"
@@ -93,6 +101,8 @@ class Settings:
     custom_chat_url: str = ""
     temperature: float = 0.2
     max_tokens: int = 4096
+    stream_batch_size: int = 16
+    stream_flush_ms: int = 25
     top_k: int = 15
     context_cap: int = 10000
     chunk_target: int = 1000
@@ -272,21 +282,39 @@ def get_user_name() -> str:
         return "the user"
 
 
-def get_current_date() -> str:
-    """Get the current date formatted for the system prompt."""
-    from datetime import datetime
-
-    return datetime.now().strftime("%Y-%m-%d")
+# (monotonic time, date string); the date is re-read at most once a minute
+_CURRENT_DATE_TTL = 60.0
+_current_date_cache: tuple[float, str] = (0.0, "")
 
 
-def get_system_prompt() -> str:
-    """Get the system prompt with {user_name} and {current_date} placeholders replaced."""
-    prompt = settings.system_prompt
-    user_name = get_user_name()
-    current_date = get_current_date()
+def get_current_date() -> str:
+    """Get the current date formatted for the system prompt."""
+    global _current_date_cache
+    now = time.monotonic()
+    cached_at, current_date = _current_date_cache
+    if not current_date or now - cached_at >= _CURRENT_DATE_TTL:
+        current_date = datetime.now().strftime("%Y-%m-%d")
+        _current_date_cache = (now, current_date)
+    return current_date
+
+
+@lru_cache(maxsize=8)
+def _render_system_prompt(prompt: str, user_name: str, current_date: str) -> str:
+    """Fill in the system prompt placeholders.
+
+    Cached on its inputs, so a settings change or a new day renders afresh
+    without any explicit invalidation.
+    """
     logger.info(
         f"System prompt placeholders: user_name='{user_name}', current_date='{current_date}'"
     )
     prompt = prompt.replace("{user_name}", user_name)
     prompt = prompt.replace("{current_date}", current_date)
     return prompt
+
+
+def get_system_prompt() -> str:
+    """Get the system prompt with {user_name} and {current_date} placeholders replaced."""
+    return _render_system_prompt(
+        settings.system_prompt, get_user_name(), get_current_date()
+    )
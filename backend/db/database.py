@@ -4,9 +4,12 @@ import asyncio
 import getpass
 import logging
 import os
+import random
+import sqlite3
 import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import AsyncGenerator, Optional
+from typing import AsyncGenerator, AsyncIterator, Iterable, Optional, Sequence
 
 import aiosqlite
 
@@ -29,35 +32,196 @@ else:
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 DB_PATH = DATA_DIR / "data.db"
 
+# Filesystems where SQLite's byte-range locks and the shared-memory WAL index
+# can't be trusted. /proc/mounts reports the host filesystem for Docker bind
+# mounts, so this also works inside the container.
+_NETWORK_FS_TYPES = frozenset(
+    {"cifs", "smb3", "smbfs", "nfs", "nfs4", "9p", "afpfs", "davfs", "fuse.sshfs"}
+)
+
+
+def _detect_storage() -> str:
+    """Return "local" or "nas" for DATA_DIR; LIFEQUERY_STORAGE overrides it."""
+    override = os.environ.get("LIFEQUERY_STORAGE", "").strip().lower()
+    if override in ("local", "nas"):
+        return override
+    try:
+        with open("/proc/mounts") as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        # No way to tell on this platform; keep the NAS-safe settings.
+        return "nas"
+    data_dir = str(DATA_DIR.resolve())
+    best_point, best_type = "", None
+    for point, fstype in mounts:
+        point = point.replace("\\040", " ")
+        inside = data_dir == point or data_dir.startswith(point.rstrip("/") + "/")
+        if inside and len(point) > len(best_point):
+            best_point, best_type = point, fstype
+    if best_type is None or best_type in _NETWORK_FS_TYPES:
+        return "nas"
+    return "local"
+
+
+STORAGE_MODE = _detect_storage()
+
+if STORAGE_MODE == "local":
+    # Local disk: WAL lets readers run alongside the writer, and NORMAL is the
+    # safe pairing for WAL (power loss can drop the last commits but cannot
+    # corrupt the file).
+    _URI_PARAMS = ""
+    _JOURNAL_PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA wal_autocheckpoint=1000",
+    )
+else:
+    # nolock=1 is critical for SMB mounts that don't support byte-range locking.
+    _URI_PARAMS = "?nolock=1"
+    _JOURNAL_PRAGMAS = (
+        # journal_mode=MEMORY keeps the rollback journal in RAM, avoiding NAS file locking issues
+        "PRAGMA journal_mode=MEMORY",
+        # synchronous=OFF trades durability for speed on NAS.
+        # WARNING: Power loss during a write can corrupt the DB. This is an intentional tradeoff for NAS stability.
+        "PRAGMA synchronous=OFF",
+    )
+
+# .as_uri() formats the path correctly for all OSs. DB_PATH is fixed for the
+# life of the process, so build the URI once rather than on every connect.
+_DB_URI = DB_PATH.absolute().as_uri()
+_CONNECTION_URI = f"{_DB_URI}{_URI_PARAMS}"
+# Pooled readers open with mode=ro: SQLite never takes a reserved lock or
+# creates a journal for them, and a stray write fails instead of racing the
+# writer connection.
+_READ_CONNECTION_URI = f"{_DB_URI}?mode=ro{_URI_PARAMS.replace('?', '&')}"
+
+# Pragmas every connection needs.
+_BASE_PRAGMAS = (
+    "PRAGMA busy_timeout=60000",
+    "PRAGMA temp_store=MEMORY",
+    # Disable mmap as it often fails on network shares
+    "PRAGMA mmap_size=0",
+    # 64 MiB page cache: sync and import bursts touch far more pages than
+    # the old 5 MB held. Pages are only allocated as they are used.
+    "PRAGMA cache_size=-65536",
+)
+
+# Connection-level pragmas, sent as one script so a new connection costs a
+# single round-trip through aiosqlite's thread instead of one per pragma.
+# Read-only connections skip the journal settings, which only affect writes.
+_CONNECTION_PRAGMAS = ";\n".join(
+    (*_BASE_PRAGMAS, *_JOURNAL_PRAGMAS, "PRAGMA foreign_keys=ON")
+) + ";"
+_READ_CONNECTION_PRAGMAS = ";\n".join(_BASE_PRAGMAS) + ";"
+
+# Resolved once up front: getpass.getuser() can fall through to a passwd/LDAP
+# lookup, which must not happen on the failure path of get_connection().
+try:
+    _USERNAME = getpass.getuser()
+except Exception:
+    _USERNAME = os.environ.get("USER", "?")
+
 # Global lock to ensure only one task writes at a time.
 # This is a 'soft' lock that helps prevent contention on the NAS filesystem.
 _write_lock = asyncio.Lock()
 
+# Long-lived connections shared by the query helpers below. Opening a
+# connection re-reads the file and re-runs every PRAGMA, which dominates the
+# cost of small queries on a NAS mount. The single writer connection is only
+# used while holding _write_lock; idle reader connections are kept up to
+# _READ_POOL_SIZE and handed out without locking so reads run in parallel.
+_READ_POOL_SIZE = 4
+
+# sqlite3 keeps a per-connection cache of prepared statements keyed by SQL
+# text, so with long-lived connections each distinct query is parsed once.
+# The default of 128 entries is smaller than the set of statements the app
+# sends through the shared writer, so raise it to avoid evicting hot ones.
+_STATEMENT_CACHE_SIZE = 512
+_read_pool: list[aiosqlite.Connection] = []
+_writer: Optional[aiosqlite.Connection] = None
+
+# Writes queued by execute_write(). The first call in a burst starts a drain
+# task that waits _WRITE_BATCH_WINDOW for more writes to pile up, then applies
+# all of them on the writer connection with a single commit.
+_WRITE_BATCH_WINDOW = 0.005
+_pending_writes: list[tuple[str, tuple, asyncio.Future]] = []
+_drain_task: Optional[asyncio.Task] = None
+
 
 def cleanup_stale_locks():
-    """Aggressively clean up stale locks and 0-byte files."""
+    """Aggressively clean up stale locks and 0-byte files.
+
+    Only safe before this process has opened any connection; init_db() calls
+    it once at startup.
+    """
+    # Lock files to remove. Never on local storage: there a leftover -wal
+    # file holds committed transactions that SQLite replays on open.
+    lock_suffixes = () if STORAGE_MODE == "local" else ("-wal", "-shm", "-journal")
+    db_name = DB_PATH.name
     try:
-        # If DB is 0 bytes, it's a failed init. Delete it so we can try again.
-        if DB_PATH.exists() and DB_PATH.stat().st_size == 0:
-            logger.warning(f"Removing 0-byte database file: {DB_PATH}")
-            DB_PATH.unlink()
-
-        # Remove lock files
-        for suffix in ["-wal", "-shm", "-journal"]:
-            lock_file = DB_PATH.with_suffix(DB_PATH.suffix + suffix)
-            if lock_file.exists():
-                try:
-                    lock_file.unlink()
-                    logger.info(f"Cleaned up stale lock: {lock_file}")
-                except Exception as e:
-                    logger.error(f"Failed to clean {lock_file}: {e}")
+        # One directory listing instead of an exists()/stat() per candidate,
+        # which adds up on a NAS mount.
+        with os.scandir(DATA_DIR) as entries:
+            for entry in entries:
+                name = entry.name
+                if name == db_name:
+                    # If DB is 0 bytes, it's a failed init. Delete it so we can try again.
+                    if entry.stat().st_size == 0:
+                        logger.warning(f"Removing 0-byte database file: {DB_PATH}")
+                        os.unlink(entry.path)
+                elif name.startswith(db_name) and name[len(db_name):] in lock_suffixes:
+                    try:
+                        os.unlink(entry.path)
+                        logger.info(f"Cleaned up stale lock: {entry.path}")
+                    except Exception as e:
+                        logger.error(f"Failed to clean {entry.path}: {e}")
     except Exception as e:
         logger.error(f"Error checking for stale locks: {e}")
 
 
-cleanup_stale_locks()
+_stale_locks_cleaned = False
 
-SCHEMA_SQL = """
+# Small tables keyed by a TEXT primary key. WITHOUT ROWID stores each one as
+# a single b-tree on that key instead of a rowid table plus a separate
+# unique index, and STRICT rejects values of the wrong type. Kept separate
+# from SCHEMA_SQL so init_db can rebuild tables created before these options.
+_KEYED_TABLES = {
+    "config": """
+    key TEXT PRIMARY KEY,
+    value TEXT,
+    updated_at INTEGER NOT NULL
+""",
+    "chats": """
+    chat_id TEXT PRIMARY KEY,
+    chat_name TEXT,
+    chat_type TEXT,
+    included INTEGER DEFAULT 1,
+    message_count INTEGER DEFAULT 0,
+    last_message_at INTEGER,
+    last_chunked_at INTEGER DEFAULT 0,
+    created_at INTEGER NOT NULL
+""",
+    "providers": """
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    provider_type TEXT NOT NULL,
+    base_url TEXT,
+    api_key TEXT,
+    last_model TEXT,
+    updated_at INTEGER NOT NULL
+""",
+}
+# STRICT needs SQLite 3.37+; older libraries still get WITHOUT ROWID.
+_KEYED_TABLE_OPTIONS = (
+    "WITHOUT ROWID, STRICT"
+    if sqlite3.sqlite_version_info >= (3, 37, 0)
+    else "WITHOUT ROWID"
+)
+
+SCHEMA_SQL = "".join(
+    f"CREATE TABLE IF NOT EXISTS {name} ({columns}) {_KEYED_TABLE_OPTIONS};\n"
+    for name, columns in _KEYED_TABLES.items()
+) + """
 CREATE TABLE IF NOT EXISTS messages (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     message_id TEXT NOT NULL,
@@ -89,12 +253,8 @@ CREATE TABLE IF NOT EXISTS chunks (
     content TEXT NOT NULL,
     content_hash TEXT NOT NULL,
     embedding_version TEXT NOT NULL,
-    embedded_at INTEGER
-);
-CREATE TABLE IF NOT EXISTS config (
-    key TEXT PRIMARY KEY,
-    value TEXT,
-    updated_at INTEGER NOT NULL
+    embedded_at INTEGER,
+    embedded_hash TEXT
 );
 CREATE TABLE IF NOT EXISTS sync_log (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -108,58 +268,152 @@ CREATE TABLE IF NOT EXISTS sync_log (
     skipped_empty INTEGER,
     detail TEXT
 );
-CREATE TABLE IF NOT EXISTS chats (
-    chat_id TEXT PRIMARY KEY,
-    chat_name TEXT,
-    chat_type TEXT,
-    included INTEGER DEFAULT 1,
-    message_count INTEGER DEFAULT 0,
-    last_message_at INTEGER,
-    last_chunked_at INTEGER DEFAULT 0,
-    created_at INTEGER NOT NULL
-);
-CREATE TABLE IF NOT EXISTS providers (
-    id TEXT PRIMARY KEY,
-    name TEXT NOT NULL,
-    provider_type TEXT NOT NULL,
-    base_url TEXT,
-    api_key TEXT,
-    last_model TEXT,
-    updated_at INTEGER NOT NULL
-);
 CREATE INDEX IF NOT EXISTS idx_messages_chat_id ON messages(chat_id);
 CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages(timestamp);
 CREATE INDEX IF NOT EXISTS idx_chunks_chat_id ON chunks(chat_id);
 CREATE INDEX IF NOT EXISTS idx_chunks_content_hash ON chunks(content_hash);
+CREATE TABLE IF NOT EXISTS chunk_participants (
+    participant TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    PRIMARY KEY (participant, chunk_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_chunk_participants_chunk_id
+    ON chunk_participants(chunk_id);
+CREATE TRIGGER IF NOT EXISTS trg_chunks_participants_insert
+AFTER INSERT ON chunks BEGIN
+    INSERT OR IGNORE INTO chunk_participants (participant, chunk_id)
+    SELECT value, NEW.chunk_id FROM json_each(
+        CASE WHEN json_valid(NEW.participants) THEN NEW.participants ELSE '[]' END
+    );
+END;
+CREATE TRIGGER IF NOT EXISTS trg_chunks_participants_delete
+AFTER DELETE ON chunks BEGIN
+    DELETE FROM chunk_participants WHERE chunk_id = OLD.chunk_id;
+END;
 """
 
+# Providers every install starts with: (id, name, provider_type, base_url,
+# api_key, last_model).
+_DEFAULT_PROVIDERS = (
+    ("ollama", "Ollama (Local)", "ollama", "http://ollama:11434", None, "qwen3:8b"),
+    (
+        "openai",
+        "OpenAI",
+        "openai",
+        "https://api.openai.com/v1",
+        None,
+        "gpt-4o-mini",
+    ),
+    (
+        "openrouter",
+        "OpenRouter (Cloud)",
+        "openrouter",
+        "https://openrouter.ai/api/v1",
+        None,
+        "",
+    ),
+    (
+        "minimax",
+        "MiniMax Coding Plan",
+        "minimax",
+        "https://api.minimax.io/v1",
+        None,
+        "MiniMax-M2.5",
+    ),
+    (
+        "glmai",
+        "Z.AI Coding Plan",
+        "glmai",
+        "https://api.z.ai/api/coding/paas/v4",
+        None,
+        "glm-4.7",
+    ),
+)
+
+_SEED_PROVIDER_SQL = """INSERT OR IGNORE INTO providers
+    (id, name, provider_type, base_url, api_key, last_model, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)"""
+
+# Column order for the rows passed to insert_messages().
+MESSAGE_COLUMNS = (
+    "message_id",
+    "chat_id",
+    "chat_name",
+    "sender_id",
+    "sender_name",
+    "is_forwarded",
+    "forward_sender_id",
+    "forward_sender_name",
+    "forward_date",
+    "forward_chat_id",
+    "forward_message_id",
+    "text",
+    "timestamp",
+    "source",
+    "imported_at",
+)
+_INSERT_MESSAGES_SQL = (
+    f"INSERT OR IGNORE INTO messages ({', '.join(MESSAGE_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(MESSAGE_COLUMNS))})"
+)
+
+# Columns added to existing tables after their first release, as
+# (table, column, definition). init_db adds whichever ones are missing.
+_COLUMN_MIGRATIONS = (
+    # Deduplication counts for sync runs
+    ("sync_log", "skipped_duplicate", "INTEGER"),
+    ("sync_log", "skipped_empty", "INTEGER"),
+    # Telegram forward provenance. The author of a forwarded message is not
+    # its forwarding sender, and losing this information makes downstream
+    # summaries factually wrong.
+    ("messages", "is_forwarded", "INTEGER NOT NULL DEFAULT 0"),
+    ("messages", "forward_sender_id", "TEXT"),
+    ("messages", "forward_sender_name", "TEXT"),
+    ("messages", "forward_date", "INTEGER"),
+    ("messages", "forward_chat_id", "TEXT"),
+    ("messages", "forward_message_id", "TEXT"),
+    # Per-chat chunking watermark
+    ("chats", "last_chunked_at", "INTEGER DEFAULT 0"),
+    # content_hash the stored vector was built from (NULL = not known)
+    ("chunks", "embedded_hash", "TEXT"),
+)
+
+
+async def _open_and_configure(read_only: bool = False) -> aiosqlite.Connection:
+    """Open DB_PATH and apply the connection pragmas in one round-trip."""
+    # Open the connection with a generous timeout (and nolock=1 on NAS).
+    pending = aiosqlite.connect(
+        _READ_CONNECTION_URI if read_only else _CONNECTION_URI,
+        timeout=30.0,
+        uri=True,
+        cached_statements=_STATEMENT_CACHE_SIZE,
+    )
+    # Pooled connections live until shutdown; a daemon worker thread keeps
+    # one that was never closed from blocking interpreter exit.
+    # aiosqlite < 0.20 subclasses Thread, newer versions wrap one.
+    getattr(pending, "_thread", pending).daemon = True
+    db = await pending
+    try:
+        await db.executescript(
+            _READ_CONNECTION_PRAGMAS if read_only else _CONNECTION_PRAGMAS
+        )
+    except BaseException:
+        await db.close()
+        raise
+    return db
+
 
-async def get_connection() -> aiosqlite.Connection:
-    """Get a database connection optimized for NAS storage with retries."""
+async def get_connection(read_only: bool = False) -> aiosqlite.Connection:
+    """Get a database connection optimized for NAS storage with retries.
+
+    Args:
+        read_only: Open the file with mode=ro. The database must already
+            exist, which init_db() guarantees at startup.
+    """
     last_err = None
     for attempt in range(5):
         try:
-            # 1. Open the connection with a generous timeout and nolock=1
-            # nolock=1 is critical for SMB mounts that don't support byte-range locking.
-            # We use .as_uri() to correctly format the path for all OSs, then append nolock.
-            uri = DB_PATH.absolute().as_uri()
-            connection_uri = f"{uri}?nolock=1"
-            db = await aiosqlite.connect(connection_uri, timeout=30.0, uri=True)
-
-            # Configure connection-level pragmas (NAS Optimized)
-            await db.execute("PRAGMA busy_timeout=60000")
-            await db.execute("PRAGMA temp_store=MEMORY")
-            # journal_mode=MEMORY keeps the rollback journal in RAM, avoiding NAS file locking issues
-            await db.execute("PRAGMA journal_mode=MEMORY")
-            # synchronous=OFF trades durability for speed on NAS.
-            # WARNING: Power loss during a write can corrupt the DB. This is an intentional tradeoff for NAS stability.
-            await db.execute("PRAGMA synchronous=OFF")
-            # Disable mmap as it often fails on network shares
-            await db.execute("PRAGMA mmap_size=0")
-            await db.execute("PRAGMA cache_size=-5000")
-            await db.execute("PRAGMA foreign_keys=ON")
-
-            return db
+            return await _open_and_configure(read_only)
         except Exception as e:
             last_err = e
             error_msg = str(e).lower()
@@ -173,7 +427,10 @@ async def get_connection() -> aiosqlite.Connection:
                 break
 
             logger.warning(f"Connection attempt {attempt + 1} failed: {e}. Retrying...")
-            await asyncio.sleep(1)
+            # Exponential backoff from 50 ms (most SMB glitches clear that
+            # fast), capped at 2 s, with jitter so concurrent callers don't
+            # all retry at the same instant.
+            await asyncio.sleep(min(0.05 * 2**attempt, 2.0) + random.random() * 0.05)
 
     # If all retries fail
     if "malformed" in str(last_err).lower():
@@ -206,18 +463,11 @@ async def get_connection() -> aiosqlite.Connection:
                         logger.error(f"Failed to rename chroma folder: {c_err}")
 
                 # 3. EMERGENCY RETRY: Now that the corrupted file is gone,
-                # a fresh connection should work and create a new file.
+                # a fresh connection should work and create a new file. It is
+                # always opened read-write since the file has to be created.
                 logger.info("Attempting to create a fresh database file...")
                 try:
-                    abs_path = DB_PATH.absolute()
-                    connection_uri = f"file://{abs_path}?nolock=1"
-                    db = await aiosqlite.connect(connection_uri, timeout=30.0, uri=True)
-
-                    # Configure connection-level pragmas (read-safe)
-                    await db.execute("PRAGMA busy_timeout=60000")
-                    await db.execute("PRAGMA temp_store=MEMORY")
-                    await db.execute("PRAGMA foreign_keys=ON")
-
+                    db = await _open_and_configure()
                     logger.info("Fresh database file created successfully.")
                     return db
                 except Exception as retry_err:
@@ -229,7 +479,7 @@ async def get_connection() -> aiosqlite.Connection:
         raise last_err
 
     logger.error(
-        f"PERMANENT FAILURE connecting to DB at {DB_PATH}. User: {getpass.getuser()}. Error: {last_err}"
+        f"PERMANENT FAILURE connecting to DB at {DB_PATH}. User: {_USERNAME}. Error: {last_err}"
     )
     # If connection fails, check if the parent directory is writable
     if not DATA_DIR.exists():
@@ -239,88 +489,220 @@ async def get_connection() -> aiosqlite.Connection:
     raise last_err
 
 
-async def execute_write(sql: str, params: tuple = ()) -> None:
-    """Execute a write operation with a global lock and retries for NAS safety."""
+async def _acquire() -> aiosqlite.Connection:
+    """Take an idle reader connection from the pool, opening one if empty."""
+    if _read_pool:
+        return _read_pool.pop()
+    return await get_connection(read_only=True)
+
+
+async def _release(db: aiosqlite.Connection) -> None:
+    """Return a reader connection to the pool, closing it if the pool is full."""
+    if len(_read_pool) < _READ_POOL_SIZE:
+        _read_pool.append(db)
+    else:
+        await db.close()
+
+
+@asynccontextmanager
+async def _acquired() -> AsyncIterator[aiosqlite.Connection]:
+    """Borrow a pooled reader connection for the duration of the block.
+
+    Reader connections only run single SELECTs in autocommit mode; they must
+    never open a transaction, since a read lock held here would stall writers.
+    """
+    db = await _acquire()
+    try:
+        yield db
+    except BaseException:
+        # The connection may be mid-transaction or broken; don't recycle it.
+        await db.close()
+        raise
+    await _release(db)
+
+
+@asynccontextmanager
+async def _writer_acquired(
+    immediate: bool = False,
+) -> AsyncIterator[aiosqlite.Connection]:
+    """Hold _write_lock and yield the shared writer connection.
+
+    With immediate=True the write transaction is opened up front with BEGIN
+    IMMEDIATE. A deferred transaction that starts with a read takes a shared
+    lock first and can hit SQLITE_BUSY when it later upgrades to write.
+    """
+    global _writer
     async with _write_lock:
-        db = await get_connection()
+        if _writer is None:
+            _writer = await get_connection()
         try:
-            await db.execute(sql, params)
-            await db.commit()
-        finally:
+            if immediate and not _writer.in_transaction:
+                await _writer.execute("BEGIN IMMEDIATE")
+            yield _writer
+        except BaseException:
+            db, _writer = _writer, None
+            await db.close()
+            raise
+
+
+async def close_pool() -> None:
+    """Close the writer and all idle reader connections."""
+    global _writer
+    async with _write_lock:
+        if _writer is not None:
+            db, _writer = _writer, None
             await db.close()
+    while _read_pool:
+        await _read_pool.pop().close()
+
+
+async def _drain_writes() -> None:
+    """Apply queued execute_write() calls in batches, one commit per batch."""
+    while _pending_writes:
+        await asyncio.sleep(_WRITE_BATCH_WINDOW)
+        batch = _pending_writes[:]
+        _pending_writes.clear()
+        try:
+            async with _writer_acquired(immediate=True) as db:
+                for sql, params, future in batch:
+                    try:
+                        await db.execute(sql, params)
+                    except Exception as e:
+                        # A failed statement is rolled back on its own; the
+                        # rest of the batch still commits.
+                        if not future.done():
+                            future.set_exception(e)
+                await db.commit()
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+        for _, _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+
+async def execute_write(sql: str, params: tuple = ()) -> None:
+    """Execute a write operation with a global lock and retries for NAS safety.
+
+    Concurrent calls are combined into one transaction by _drain_writes();
+    this returns once the batch containing the write has been committed.
+    """
+    global _drain_task
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    _pending_writes.append((sql, params, future))
+    if (
+        _drain_task is None
+        or _drain_task.done()
+        or _drain_task.get_loop() is not loop
+    ):
+        _drain_task = loop.create_task(_drain_writes())
+    await future
+
+
+@asynccontextmanager
+async def transaction() -> AsyncIterator[aiosqlite.Connection]:
+    """Yield the writer connection and commit everything done in the block once.
+
+    Use this instead of several execute_write() calls when a burst of writes
+    belongs together: they share one lock acquisition and one commit, and
+    are rolled back together if the block raises.
+    """
+    async with _writer_acquired(immediate=True) as db:
+        try:
+            yield db
+        except BaseException:
+            await db.rollback()
+            raise
+        await db.commit()
+
+
+async def execute_many(sql: str, rows: Iterable[tuple]) -> int:
+    """Run one statement for every parameter tuple in a single transaction.
+
+    Returns:
+        The total number of rows changed.
+    """
+    async with transaction() as db:
+        cursor = await db.executemany(sql, rows)
+        return cursor.rowcount
+
+
+async def insert_messages(rows: Sequence[tuple]) -> int:
+    """Insert message rows in one transaction, skipping ones already stored.
+
+    Each row holds the values for MESSAGE_COLUMNS, in that order.
+
+    Returns:
+        The number of rows actually inserted.
+    """
+    if not rows:
+        return 0
+    return await execute_many(_INSERT_MESSAGES_SQL, rows)
 
 
 async def execute_fetchall(sql: str, params: tuple = ()) -> list:
-    """Execute a query and return all results, handling connection cleanup."""
-    db = await get_connection()
-    try:
+    """Execute a query and return all results on a pooled connection."""
+    async with _acquired() as db:
         cursor = await db.execute(sql, params)
         return await cursor.fetchall()
-    finally:
-        await db.close()
 
 
 async def execute_fetchone(sql: str, params: tuple = ()) -> Optional[tuple]:
-    """Execute a query and return one result, handling connection cleanup."""
-    db = await get_connection()
-    try:
+    """Execute a query and return one result on a pooled connection."""
+    async with _acquired() as db:
         cursor = await db.execute(sql, params)
         return await cursor.fetchone()
-    finally:
-        await db.close()
 
 
-async def seed_providers(db: aiosqlite.Connection) -> None:
-    """Pre-populate the providers table with default records."""
-    import time
+async def seed_providers(db: aiosqlite.Connection, commit: bool = True) -> None:
+    """Pre-populate the providers table with default records.
 
+    Pass commit=False to leave the rows in the caller's open transaction.
+    """
     now = int(time.time())
+    # INSERT OR IGNORE so we don't overwrite user changes if they exist
+    await db.executemany(
+        _SEED_PROVIDER_SQL, [(*row, now) for row in _DEFAULT_PROVIDERS]
+    )
+    if commit:
+        await db.commit()
+
+
+async def _rebuild_keyed_table(
+    db: aiosqlite.Connection, table: str, columns: str
+) -> None:
+    """Recreate `table` with _KEYED_TABLE_OPTIONS, copying its rows over.
 
-    defaults = [
-        ("ollama", "Ollama (Local)", "ollama", "http://ollama:11434", None, "qwen3:8b"),
-        (
-            "openai",
-            "OpenAI",
-            "openai",
-            "https://api.openai.com/v1",
-            None,
-            "gpt-4o-mini",
-        ),
-        (
-            "openrouter",
-            "OpenRouter (Cloud)",
-            "openrouter",
-            "https://openrouter.ai/api/v1",
-            None,
-            "",
-        ),
-        (
-            "minimax",
-            "MiniMax Coding Plan",
-            "minimax",
-            "https://api.minimax.io/v1",
-            None,
-            "MiniMax-M2.5",
-        ),
-        (
-            "glmai",
-            "Z.AI Coding Plan",
-            "glmai",
-            "https://api.z.ai/api/coding/paas/v4",
-            None,
-            "glm-4.7",
-        ),
-    ]
-
-    for pid, name, ptype, url, key, model in defaults:
-        # INSERT OR IGNORE so we don't overwrite user changes if they exist
+    Runs in one transaction; if any row doesn't fit the stricter definition
+    the old table is left untouched.
+    """
+    staging = f"{table}_rebuild"
+    await db.commit()
+    try:
+        await db.execute("BEGIN IMMEDIATE")
+        await db.execute(f"DROP TABLE IF EXISTS {staging}")
         await db.execute(
-            """INSERT OR IGNORE INTO providers
-               (id, name, provider_type, base_url, api_key, last_model, updated_at)
-               VALUES (?, ?, ?, ?, ?, ?, ?)""",
-            (pid, name, ptype, url, key, model, now),
+            f"CREATE TABLE {staging} ({columns}) {_KEYED_TABLE_OPTIONS}"
         )
-    await db.commit()
+        cursor = await db.execute(f"PRAGMA table_info({table})")
+        old_columns = {row[1] for row in await cursor.fetchall()}
+        cursor = await db.execute(f"PRAGMA table_info({staging})")
+        shared = ", ".join(
+            row[1] for row in await cursor.fetchall() if row[1] in old_columns
+        )
+        await db.execute(
+            f"INSERT INTO {staging} ({shared}) SELECT {shared} FROM {table}"
+        )
+        await db.execute(f"DROP TABLE {table}")
+        await db.execute(f"ALTER TABLE {staging} RENAME TO {table}")
+        await db.commit()
+        logger.info("Rebuilt %s table as %s", table, _KEYED_TABLE_OPTIONS)
+    except Exception as e:
+        await db.rollback()
+        logger.warning("Could not rebuild %s table: %s", table, e)
 
 
 async def init_db() -> None:
@@ -329,57 +711,53 @@ async def init_db() -> None:
     Creates all required tables if they don't exist, seeds default providers,
     and runs any necessary migrations for existing databases.
     """
+    global _stale_locks_cleaned
     logger.info(f"Initializing database at {DB_PATH}")
-    db = await get_connection()
-    try:
-        # Performance configuration for NAS
-        await db.execute("PRAGMA journal_mode=MEMORY")
-        await db.execute("PRAGMA synchronous=OFF")
-        await db.execute("PRAGMA mmap_size=0")
-
-        await db.executescript(SCHEMA_SQL)
-        await db.commit()
+    if not _stale_locks_cleaned:
+        cleanup_stale_locks()
+        _stale_locks_cleaned = True
+    # Schema setup runs on the shared writer connection, which also warms the
+    # pool so the first request doesn't pay for opening it.
+    async with _writer_acquired() as db:
+        cursor = await db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunk_participants'"
+        )
+        had_chunk_participants = await cursor.fetchone() is not None
 
-        # Seed initial providers
-        await seed_providers(db)
+        # Everything up to the final commit runs in one write transaction, so
+        # startup pays for a single journal flush. executescript() commits
+        # before running, so the BEGIN has to be part of the script itself.
+        await db.executescript("BEGIN IMMEDIATE;\n" + SCHEMA_SQL)
 
-        # Migration: add deduplication counts to sync_log table for existing databases
-        try:
-            await db.execute(
-                "ALTER TABLE sync_log ADD COLUMN skipped_duplicate INTEGER"
-            )
-            logger.info("Added skipped_duplicate column to sync_log table")
-        except Exception as e:
-            # Column likely already exists
-            if "duplicate column" not in str(e).lower():
-                logger.warning(f"Could not add skipped_duplicate column: {e}")
+        # Migration: chunk_participants is kept in sync by triggers on chunks;
+        # fill it once for chunks written before the table existed.
+        if not had_chunk_participants:
+            await db.execute("""
+                INSERT OR IGNORE INTO chunk_participants (participant, chunk_id)
+                SELECT j.value, c.chunk_id
+                FROM chunks c, json_each(
+                    CASE WHEN json_valid(c.participants) THEN c.participants ELSE '[]' END
+                ) j
+            """)
 
-        try:
-            await db.execute("ALTER TABLE sync_log ADD COLUMN skipped_empty INTEGER")
-            logger.info("Added skipped_empty column to sync_log table")
-        except Exception as e:
-            # Column likely already exists
-            if "duplicate column" not in str(e).lower():
-                logger.warning(f"Could not add skipped_empty column: {e}")
-
-        # Migration: preserve Telegram forward provenance.  The author of a
-        # forwarded message is not its forwarding sender, and losing this
-        # information makes downstream summaries factually wrong.
-        message_columns = (
-            ("is_forwarded", "INTEGER NOT NULL DEFAULT 0"),
-            ("forward_sender_id", "TEXT"),
-            ("forward_sender_name", "TEXT"),
-            ("forward_date", "INTEGER"),
-            ("forward_chat_id", "TEXT"),
-            ("forward_message_id", "TEXT"),
-        )
-        for column, definition in message_columns:
+        # Seed initial providers
+        await seed_providers(db, commit=False)
+
+        # Migration: add columns introduced after a table was first created.
+        # Checking PRAGMA table_info first keeps this free on databases that
+        # are already current, including fresh ones built from SCHEMA_SQL.
+        existing: dict[str, set[str]] = {}
+        for table, column, definition in _COLUMN_MIGRATIONS:
+            if table not in existing:
+                cursor = await db.execute(f"PRAGMA table_info({table})")
+                existing[table] = {row[1] for row in await cursor.fetchall()}
+            if column in existing[table]:
+                continue
             try:
-                await db.execute(f"ALTER TABLE messages ADD COLUMN {column} {definition}")
-                logger.info("Added messages.%s column", column)
+                await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                logger.info("Added %s.%s column", table, column)
             except Exception as e:
-                if "duplicate column" not in str(e).lower():
-                    logger.warning("Could not add messages.%s column: %s", column, e)
+                logger.warning("Could not add %s.%s column: %s", table, column, e)
 
         try:
             await db.execute(
@@ -389,32 +767,6 @@ async def init_db() -> None:
         except Exception as e:
             logger.warning("Could not create forward-sender index: %s", e)
 
-        # Migration: create chats table for existing databases
-        try:
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS chats (
-                    chat_id TEXT PRIMARY KEY,
-                    chat_name TEXT,
-                    chat_type TEXT,
-                    included INTEGER DEFAULT 1,
-                    message_count INTEGER DEFAULT 0,
-                    last_message_at INTEGER,
-                    last_chunked_at INTEGER DEFAULT 0,
-                    created_at INTEGER NOT NULL
-                )
-            """)
-            logger.info("Created or verified chats table")
-        except Exception as e:
-            logger.warning(f"Could not create chats table: {e}")
-
-        # Migration: add last_chunked_at column to existing chats table
-        try:
-            await db.execute("ALTER TABLE chats ADD COLUMN last_chunked_at INTEGER DEFAULT 0")
-            logger.info("Added last_chunked_at column to chats table")
-        except Exception as e:
-            if "duplicate column" not in str(e).lower():
-                logger.warning(f"Could not add last_chunked_at column: {e}")
-
         # Migration: Seed last_chunked_at for already processed chats
         try:
             # One-time catch-up: If a chat already has chunks, mark its last_chunked_at 
@@ -430,8 +782,19 @@ async def init_db() -> None:
             logger.warning(f"Could not seed last_chunked_at column: {e}")
 
         await db.commit()
-    finally:
-        await db.close()
+
+        # Migration: rebuild keyed tables created before they were WITHOUT
+        # ROWID/STRICT. Each rebuild is its own transaction so one that fails
+        # leaves its old table in place; it runs after the column migrations
+        # so every column the new definition expects is already present.
+        for table, columns in _KEYED_TABLES.items():
+            cursor = await db.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (table,),
+            )
+            row = await cursor.fetchone()
+            if row and "WITHOUT ROWID" not in row[0].upper():
+                await _rebuild_keyed_table(db, table, columns)
     logger.info("Database initialized successfully")
 
 
@@ -454,43 +817,75 @@ async def get_db() -> AsyncGenerator[aiosqlite.Connection, None]:
 # These helpers reduce boilerplate and ensure consistent query patterns.
 
 
-async def count(table: str, where: str | None = None, params: tuple = ()) -> int:
-    """Generic count query."""
+# One fixed statement per countable table: the SQL text never varies, so the
+# per-connection statement cache always hits, and a table name can't be
+# smuggled in from a caller.
+_COUNT_QUERIES = {
+    table: f"SELECT COUNT(*) FROM {table}"
+    for table in (
+        "messages",
+        "chunks",
+        "chunk_participants",
+        "chats",
+        "config",
+        "providers",
+        "sync_log",
+    )
+}
+
+
+async def count(
+    table: str, where: str | None = None, params: tuple | dict = ()
+) -> int:
+    """Generic count query.
+
+    `where` should be a fixed template with ? or :name placeholders, with the
+    values passed in `params`, so each template maps to one cached statement.
+    """
+    try:
+        query = _COUNT_QUERIES[table]
+    except KeyError:
+        raise ValueError(f"count() does not support table {table!r}") from None
     if where:
-        query = f"SELECT COUNT(*) FROM {table} WHERE {where}"
-    else:
-        query = f"SELECT COUNT(*) FROM {table}"
+        query = f"{query} WHERE {where}"
 
     row = await execute_fetchone(query, params)
     return row[0] if row else 0
 
 
+def _rows_as_dicts(cursor: aiosqlite.Cursor) -> None:
+    """Make an executed cursor return dicts keyed by column name.
+
+    The column names are read once, and the dicts are built by the row
+    factory inside aiosqlite's worker thread rather than on the event loop.
+    """
+    columns = tuple(desc[0] for desc in cursor.description)
+    cursor.row_factory = lambda _cursor, row: dict(zip(columns, row))
+
+
 async def fetch_one(query: str, params: tuple = ()) -> dict | None:
     """Execute a query and fetch one row as a dictionary."""
-    db = await get_connection()
-    try:
+    async with _acquired() as db:
         cursor = await db.execute(query, params)
-        row = await cursor.fetchone()
-        if row is None:
-            return None
-        columns = [desc[0] for desc in cursor.description]
-        return dict(zip(columns, row))
-    finally:
-        await db.close()
+        _rows_as_dicts(cursor)
+        return await cursor.fetchone()
 
 
 async def fetch_all(query: str, params: tuple = ()) -> list[dict]:
     """Execute a query and fetch all rows as dictionaries."""
-    db = await get_connection()
-    try:
+    async with _acquired() as db:
         cursor = await db.execute(query, params)
-        rows = await cursor.fetchall()
-        if not rows:
-            return []
-        columns = [desc[0] for desc in cursor.description]
-        return [dict(zip(columns, row)) for row in rows]
-    finally:
-        await db.close()
+        _rows_as_dicts(cursor)
+        return await cursor.fetchall()
+
+
+async def iter_all(query: str, params: tuple = ()) -> AsyncIterator[dict]:
+    """Like fetch_all(), but yield rows lazily for large result sets."""
+    async with _acquired() as db:
+        cursor = await db.execute(query, params)
+        _rows_as_dicts(cursor)
+        async for row in cursor:
+            yield row
 
 
 # ============================================================================
@@ -510,19 +905,16 @@ async def update_message_if_unchunked(message_id: str, chat_id: str, new_text: s
         logger.debug(f"Ignoring edit for msg {message_id} in {chat_id} (already chunked)")
         return False
         
-    db = await get_connection()
-    try:
+    async with _writer_acquired(immediate=True) as db:
         cursor = await db.execute(
             """UPDATE messages SET text = ? WHERE message_id = ? AND chat_id = ? AND timestamp > ?""",
             (new_text, message_id, chat_id, last_chunked_at)
         )
         await db.commit()
-        updated = cursor.rowcount > 0
-        if updated:
-            logger.info(f"Updated unchunked message {message_id} in {chat_id}")
-        return updated
-    finally:
-        await db.close()
+    updated = cursor.rowcount > 0
+    if updated:
+        logger.info(f"Updated unchunked message {message_id} in {chat_id}")
+    return updated
 
 async def delete_messages_if_unchunked(chat_id: str, message_ids: list[str]) -> int:
     """Delete messages only if they haven't been chunked for RAG yet.
@@ -539,8 +931,7 @@ async def delete_messages_if_unchunked(chat_id: str, message_ids: list[str]) ->
     placeholders = ",".join(["?"] * len(message_ids))
     params = message_ids + [chat_id, last_chunked_at]
     
-    db = await get_connection()
-    try:
+    async with _writer_acquired(immediate=True) as db:
         cursor = await db.execute(
             f"""DELETE FROM messages 
                 WHERE message_id IN ({placeholders}) 
@@ -549,9 +940,7 @@ async def delete_messages_if_unchunked(chat_id: str, message_ids: list[str]) ->
             params
         )
         await db.commit()
-        deleted = cursor.rowcount
-        if deleted > 0:
-            logger.info(f"Deleted {deleted} unchunked messages in {chat_id}")
-        return deleted
-    finally:
-        await db.close()
+    deleted = cursor.rowcount
+    if deleted > 0:
+        logger.info(f"Deleted {deleted} unchunked messages in {chat_id}")
+    return deleted
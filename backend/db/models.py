@@ -1,10 +1,23 @@
 """Database models - plain dataclasses mirroring table rows."""
 
+import json
 import time
 from dataclasses import dataclass, field
 from typing import Optional
 
 
+def _now() -> int:
+    """Current Unix time in whole seconds (integer math, no float round-trip)."""
+    return time.time_ns() // 1_000_000_000
+
+
+# Same encoding the chunker writes (compact, UTF-8 kept as-is). Built once:
+# json.dumps() constructs a fresh encoder whenever non-default options are set.
+_encode_participants = json.JSONEncoder(
+    ensure_ascii=False, separators=(",", ":")
+).encode
+
+
 @dataclass
 class Message:
     id: Optional[int] = None
@@ -22,7 +35,7 @@ class Message:
     text: Optional[str] = None
     timestamp: int = 0
     source: str = ""
-    imported_at: int = field(default_factory=lambda: int(time.time()))
+    imported_at: int = field(default_factory=_now)
 
 
 @dataclass
@@ -39,21 +52,28 @@ class Chunk:
     content_hash: str = ""
     embedding_version: str = ""
     embedded_at: Optional[int] = None
+    embedded_hash: Optional[str] = None
+    # (participants string, parsed list) from the last parse. Keyed on the
+    # string itself so direct assignments to `participants` invalidate it.
+    _participants_cache: Optional[tuple[str, list[str]]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     def get_participants_list(self) -> list[str]:
-        """Get participants as a list (deserializes JSON string)."""
-        import json
-
-        try:
-            return json.loads(self.participants) if self.participants else []
-        except json.JSONDecodeError:
-            return []
+        """Get participants as a list (deserializes JSON string once)."""
+        cache = self._participants_cache
+        if cache is None or cache[0] is not self.participants:
+            try:
+                parsed = json.loads(self.participants) if self.participants else []
+            except json.JSONDecodeError:
+                parsed = []
+            cache = self._participants_cache = (self.participants, parsed)
+        return list(cache[1])
 
     def set_participants_list(self, participants: list[str]) -> None:
         """Set participants from a list (serializes to JSON string)."""
-        import json
-
-        self.participants = json.dumps(participants)
+        self.participants = _encode_participants(participants)
+        self._participants_cache = (self.participants, list(participants))
 
     @property
     def participants_list(self) -> list[str]:
@@ -65,7 +85,7 @@ class Chunk:
 class Config:
     key: str = ""
     value: Optional[str] = None
-    updated_at: int = field(default_factory=lambda: int(time.time()))
+    updated_at: int = field(default_factory=_now)
 
 
 @dataclass
@@ -76,7 +96,7 @@ class Chat:
     included: int = 1  # 1 = included, 0 = excluded
     message_count: int = 0
     last_message_at: Optional[int] = None
-    created_at: int = field(default_factory=lambda: int(time.time()))
+    created_at: int = field(default_factory=_now)
 
 
 @dataclass
@@ -6,8 +6,11 @@ import json
 import time
 from typing import AsyncGenerator, Optional
 
+import httpx
+import numpy as np
+from openai import APIConnectionError
+
 from config import settings
-from db.database import get_connection
 from db.models import Chunk
 from utils.logger import get_logger
 
@@ -15,20 +18,59 @@ from .ollama_embedder import check_model_exists, check_ollama_connection, embed_
 
 logger = get_logger(__name__)
 
-BATCH_SIZE = 32  # Embed 32 chunks at a time
+EMBED_CONCURRENCY = 4  # Batches in flight at once, so embed round-trips overlap
+MARK_EMBEDDED_EVERY = 8  # Embedded batches recorded per SQLite transaction
+UPSERT_BATCH_SIZE = 512  # Embedded chunks collected per ChromaDB upsert
+METADATA_PAGE_SIZE = 10_000  # Rows per paged metadata read from ChromaDB
+METADATA_IDS_BATCH_SIZE = 2048  # Ids per get(ids=...) call to ChromaDB
+CHUNK_FETCH_BATCH_SIZE = 500  # Ids per concurrent SELECT when loading chunks
 
 
 def compute_content_hash(content: str) -> str:
-    """Compute SHA256 hash of content for change detection."""
-    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+    """Compute a 64-bit SHA256 prefix of content for change detection.
+
+    Hex-encodes only the 8 bytes that are kept instead of slicing the full
+    64-character hexdigest; the value is unchanged.
+    """
+    return hashlib.sha256(content.encode("utf-8")).digest()[:8].hex()
 
 
 async def get_sqlite_chunks() -> dict[str, tuple[str, str]]:
     """Get all chunk_id -> (content_hash, content) mapping from SQLite."""
-    from db.database import fetch_all
+    from db.database import iter_all
+
+    return {
+        row["chunk_id"]: (row["content_hash"], row["content"])
+        async for row in iter_all("SELECT chunk_id, content_hash, content FROM chunks")
+    }
+
+
+async def get_sqlite_chunk_ids() -> set[str]:
+    """Get all chunk_ids from SQLite."""
+    from db.database import iter_all
 
-    rows = await fetch_all("SELECT chunk_id, content_hash, content FROM chunks")
-    return {row["chunk_id"]: (row["content_hash"], row["content"]) for row in rows}
+    return {row["chunk_id"] async for row in iter_all("SELECT chunk_id FROM chunks")}
+
+
+async def get_stale_embed_state(version: str) -> dict[str, tuple[str, Optional[str]]]:
+    """Get chunk_id -> (content_hash, embedded_hash) for chunks whose stored
+    vector isn't known to match their content under `version`.
+
+    embedded_hash is the content_hash the stored vector was built from, or
+    None if that isn't recorded (not embedded yet, or embedded before the
+    column existed). Up-to-date chunks are filtered out in SQL.
+    """
+    from db.database import iter_all
+
+    return {
+        row["chunk_id"]: (row["content_hash"], row["embedded_hash"])
+        async for row in iter_all(
+            "SELECT chunk_id, content_hash, embedded_hash FROM chunks "
+            "WHERE embedded_hash IS NULL OR embedded_hash != content_hash "
+            "OR embedding_version != ?",
+            (version,),
+        )
+    }
 
 
 async def get_embedded_chunk_ids() -> set[str]:
@@ -38,18 +80,40 @@ async def get_embedded_chunk_ids() -> set[str]:
     return await get_all_chunk_ids()
 
 
-async def get_embedded_versions() -> dict[str, str]:
-    """Get chunk_id -> embedding_version mapping from ChromaDB metadata."""
+async def get_embedded_versions(
+    until_mismatch: Optional[str] = None,
+) -> dict[str, str]:
+    """Get chunk_id -> embedding_version mapping from ChromaDB metadata.
+
+    If until_mismatch is given, paging stops after the first page containing
+    a non-empty version other than it, so the result may be partial.
+    """
     from vector_store.chroma import _get_collection
 
     collection = _get_collection()
     try:
         count = await asyncio.to_thread(collection.count)
-        result = await asyncio.to_thread(collection.get, limit=count)
         versions = {}
-        if result["metadatas"]:
-            for i, chunk_id in enumerate(result["ids"]):
-                versions[chunk_id] = result["metadatas"][i].get("embedding_version", "")
+        # Page through metadata only; get() would otherwise also serialize
+        # every document for the whole collection in one call.
+        for offset in range(0, count, METADATA_PAGE_SIZE):
+            result = await asyncio.to_thread(
+                collection.get,
+                limit=METADATA_PAGE_SIZE,
+                offset=offset,
+                include=["metadatas"],
+            )
+            if not result["ids"]:
+                break
+            page = {
+                chunk_id: (metadata or {}).get("embedding_version", "")
+                for chunk_id, metadata in zip(result["ids"], result["metadatas"] or [])
+            }
+            versions.update(page)
+            if until_mismatch is not None and any(
+                v and v != until_mismatch for v in page.values()
+            ):
+                break
         return versions
     except Exception as e:
         logger.warning(f"Could not get embedded versions: {e}")
@@ -65,7 +129,7 @@ async def check_embedding_version_mismatch() -> Optional[str]:
     current_version = settings.embedding_model
 
     try:
-        embedded_versions = await get_embedded_versions()
+        embedded_versions = await get_embedded_versions(until_mismatch=current_version)
         if not embedded_versions:
             return None  # No existing embeddings, OK
 
@@ -92,6 +156,142 @@ async def check_embedding_version_mismatch() -> Optional[str]:
     return None
 
 
+async def _mark_embedded(chunks: list[Chunk], timestamp: int) -> None:
+    """Record in SQLite that chunks now have live vectors, in one transaction."""
+    from db.database import execute_many
+
+    await execute_many(
+        "UPDATE chunks SET embedded_at = ?, embedding_version = ?, "
+        "embedded_hash = ? WHERE chunk_id = ?",
+        [
+            (timestamp, chunk.embedding_version, chunk.content_hash, chunk.chunk_id)
+            for chunk in chunks
+        ],
+    )
+
+
+def _pack_batches(chunks: list[Chunk]) -> list[list[Chunk]]:
+    """Split chunks into embed batches, in order.
+
+    A batch holds at most settings.embedding_batch_size chunks and
+    settings.embedding_max_chars_per_batch characters of content; a single
+    chunk longer than that still gets a batch of its own.
+    """
+    max_chunks = max(1, settings.embedding_batch_size)
+    max_chars = settings.embedding_max_chars_per_batch
+    batches = []
+    batch: list[Chunk] = []
+    batch_chars = 0
+    for chunk in chunks:
+        size = len(chunk.content)
+        if batch and (len(batch) >= max_chunks or batch_chars + size > max_chars):
+            batches.append(batch)
+            batch, batch_chars = [], 0
+        batch.append(chunk)
+        batch_chars += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+async def _embed_or_split(
+    batch_chunks: list[Chunk],
+) -> list[tuple[list[Chunk], Optional[np.ndarray], Optional[Exception]]]:
+    """Embed a batch, retrying each half on failure down to single chunks.
+
+    Returns (chunks, embeddings, error) parts covering the whole batch, so an
+    oversized or otherwise bad chunk only fails itself. Connection errors and
+    timeouts are not split: every part would fail the same way.
+    """
+    try:
+        embeddings = await embed_batch([chunk.content for chunk in batch_chunks])
+        return [(batch_chunks, embeddings, None)]
+    except (APIConnectionError, httpx.TransportError) as e:
+        return [(batch_chunks, None, e)]
+    except Exception as e:
+        if len(batch_chunks) == 1:
+            return [(batch_chunks, None, e)]
+        logger.warning(
+            f"Embedding {len(batch_chunks)} chunks failed ({e}); retrying in halves"
+        )
+        mid = len(batch_chunks) // 2
+        return await _embed_or_split(batch_chunks[:mid]) + await _embed_or_split(
+            batch_chunks[mid:]
+        )
+
+
+async def _embed_batches(
+    batches: list[list[Chunk]], collection=None
+) -> AsyncGenerator[tuple[int, list[Chunk], Optional[Exception]], None]:
+    """Embed batches and upsert them to ChromaDB as a three-stage pipeline.
+
+    A loader task feeds batches to EMBED_CONCURRENCY embedder tasks through a
+    bounded queue; embedded batches queue up for this generator, which is the
+    only ChromaDB writer and upserts them UPSERT_BATCH_SIZE chunks at a time.
+    Embed requests stay in flight while an upsert runs and while the caller
+    handles the previous results.
+
+    Yields (batch_idx, batch_chunks, error) as each batch is upserted (or
+    fails to embed), in completion order; error is None on success. A failed batch does not stop
+    its siblings. Work still in flight when the caller stops iterating is
+    cancelled.
+    """
+    from vector_store.chroma import upsert as chroma_upsert
+
+    embed_queue: asyncio.Queue = asyncio.Queue(maxsize=EMBED_CONCURRENCY)
+    upsert_queue: asyncio.Queue = asyncio.Queue(maxsize=EMBED_CONCURRENCY)
+
+    async def load() -> None:
+        for item in enumerate(batches):
+            await embed_queue.put(item)
+        for _ in range(EMBED_CONCURRENCY):
+            await embed_queue.put(None)
+
+    async def embed() -> None:
+        while (item := await embed_queue.get()) is not None:
+            batch_idx, batch_chunks = item
+            for part_chunks, embeddings, error in await _embed_or_split(batch_chunks):
+                await upsert_queue.put((batch_idx, part_chunks, embeddings, error))
+        await upsert_queue.put(None)
+
+    tasks = [asyncio.create_task(load())]
+    tasks += [asyncio.create_task(embed()) for _ in range(EMBED_CONCURRENCY)]
+    try:
+        running = EMBED_CONCURRENCY
+        pending = []  # embedded (batch_idx, batch_chunks, embeddings) to upsert
+        pending_chunks = 0
+        while running:
+            item = await upsert_queue.get()
+            if item is None:
+                running -= 1
+            else:
+                batch_idx, batch_chunks, embeddings, error = item
+                if error is not None:
+                    yield batch_idx, batch_chunks, error
+                else:
+                    pending.append((batch_idx, batch_chunks, embeddings))
+                    pending_chunks += len(batch_chunks)
+
+            if pending and (pending_chunks >= UPSERT_BATCH_SIZE or not running):
+                error = None
+                try:
+                    await asyncio.to_thread(
+                        chroma_upsert,
+                        [chunk for _, batch_chunks, _ in pending for chunk in batch_chunks],
+                        np.concatenate([embeddings for _, _, embeddings in pending]),
+                        collection=collection,
+                    )
+                except Exception as e:
+                    error = e
+                for batch_idx, batch_chunks, _ in pending:
+                    yield batch_idx, batch_chunks, error
+                pending, pending_chunks = [], 0
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
 async def embed_chunks_incremental() -> AsyncGenerator[dict, None]:
     """Perform incremental embedding - only embed new or changed chunks.
 
@@ -113,7 +313,16 @@ async def embed_chunks_incremental() -> AsyncGenerator[dict, None]:
 
         logger.warning(f"Embedding version mismatch detected: {version_error}")
         logger.warning("Wiping vector store for a full re-index...")
-        wipe()
+        await asyncio.to_thread(wipe)
+        # Best effort: chunks missing from Chroma are re-embedded regardless
+        try:
+            from db.database import execute_write
+
+            await execute_write(
+                "UPDATE chunks SET embedded_at = NULL, embedded_hash = NULL"
+            )
+        except Exception as e:
+            logger.warning(f"Could not clear embedded state in SQLite: {e}")
         # Continue - it will now treat everything as new
 
     # Check if embedding model is pulled
@@ -124,67 +333,99 @@ async def embed_chunks_incremental() -> AsyncGenerator[dict, None]:
         }
         return
 
-    # Get current chunks from SQLite
-    sqlite_chunks = await get_sqlite_chunks()
-    sqlite_chunk_ids = set(sqlite_chunks.keys())
+    # Get the chunks whose stored vectors may be out of date
+    current_version = settings.embedding_model
+    stale_state = await get_stale_embed_state(current_version)
 
-    # Get chunks currently in ChromaDB
-    chroma_chunk_ids = await get_embedded_chunk_ids()
+    # Idle rerun: every chunk has a vector recorded for its current content,
+    # and Chroma holds exactly as many vectors, so there is nothing to add or
+    # delete and the id listings below can be skipped.
+    if not stale_state:
+        from db.database import count as count_rows
+        from vector_store.chroma import count as count_vectors
+
+        try:
+            sqlite_count, chroma_count = await asyncio.gather(
+                count_rows("chunks"), count_vectors()
+            )
+        except Exception as e:
+            logger.warning(f"Could not compare chunk counts: {e}")
+        else:
+            if sqlite_count == chroma_count:
+                logger.info("No chunks to embed - everything is up to date")
+                yield {
+                    "type": "done",
+                    "embedded": 0,
+                    "skipped": sqlite_count,
+                    "deleted": 0,
+                    "errors": 0,
+                }
+                return
+
+    # Get current chunks and the ones in ChromaDB; the two scans hit
+    # different stores, so run them side by side
+    sqlite_chunk_ids, chroma_chunk_ids = await asyncio.gather(
+        get_sqlite_chunk_ids(), get_embedded_chunk_ids()
+    )
 
     # Determine what to do
     new_chunk_ids = sqlite_chunk_ids - chroma_chunk_ids
     deleted_chunk_ids = chroma_chunk_ids - sqlite_chunk_ids
+    shared_chunk_ids = chroma_chunk_ids & sqlite_chunk_ids  # in both — candidates for change check
 
-    # Find full chunk data from SQLite for analysis and embedding
-    from db.database import fetch_all
-
-    all_rows = await fetch_all(
-        "SELECT chunk_id, content, content_hash, chat_id, chat_name, "
-        "participants, timestamp_start, timestamp_end, message_count "
-        "FROM chunks"
-    )
-
-    chunk_data = {}
-    for row in all_rows:
-        chunk_id = row["chunk_id"]
-        chunk_data[chunk_id] = {
-            "content": row["content"],
-            "content_hash": row["content_hash"],
-            "chat_id": row["chat_id"],
-            "chat_name": row["chat_name"],
-            "participants": row["participants"],
-            "timestamp_start": row["timestamp_start"],
-            "timestamp_end": row["timestamp_end"],
-            "message_count": row["message_count"],
-        }
+    # Find changed chunks from the hash and model SQLite recorded at embed time
+    changed_chunk_ids = set()
+    unrecorded_chunk_ids = []
+    for chunk_id, (content_hash, embedded_hash) in stale_state.items():
+        if chunk_id not in chroma_chunk_ids:
+            continue  # already new
+        if embedded_hash is None:
+            unrecorded_chunk_ids.append(chunk_id)
+        else:
+            changed_chunk_ids.add(chunk_id)
 
-    # Find changed chunks by comparing hashes
     from vector_store.chroma import _get_collection
 
     collection = _get_collection()
 
-    changed_chunk_ids = set()
-    shared_chunk_ids = chroma_chunk_ids & sqlite_chunk_ids  # in both — candidates for change check
-    try:
-        chroma_count = await asyncio.to_thread(collection.count)
-        if chroma_count > 0 and shared_chunk_ids:
-            result = await asyncio.to_thread(
-                collection.get, ids=list(shared_chunk_ids), limit=chroma_count
+    # Chunks embedded before SQLite recorded embedded_hash: compare against the
+    # hash in Chroma's metadata once, and record it so later runs skip this.
+    if unrecorded_chunk_ids:
+        try:
+            results = await asyncio.gather(
+                *(
+                    asyncio.to_thread(
+                        collection.get,
+                        ids=unrecorded_chunk_ids[i : i + METADATA_IDS_BATCH_SIZE],
+                        include=["metadatas"],
+                    )
+                    for i in range(0, len(unrecorded_chunk_ids), METADATA_IDS_BATCH_SIZE)
+                )
             )
-            if result["metadatas"]:
-                for i, chunk_id in enumerate(result["ids"]):
-                    stored_hash = result["metadatas"][i].get("content_hash", "")
-                    if chunk_id in chunk_data:
-                        current_hash = chunk_data[chunk_id]["content_hash"]
-                        if stored_hash != current_hash:
+            recorded = []
+            for result in results:
+                if result["metadatas"]:
+                    for i, chunk_id in enumerate(result["ids"]):
+                        stored_hash = result["metadatas"][i].get("content_hash", "")
+                        if stored_hash == stale_state[chunk_id][0]:
+                            recorded.append((stored_hash, chunk_id))
+                        else:
                             changed_chunk_ids.add(chunk_id)
-    except Exception as e:
-        logger.warning(f"Could not check changed chunks: {e}", exc_info=True)
+            if recorded:
+                from db.database import execute_many
+
+                await execute_many(
+                    "UPDATE chunks SET embedded_hash = ? WHERE chunk_id = ?", recorded
+                )
+        except Exception as e:
+            logger.warning(f"Could not check changed chunks: {e}", exc_info=True)
 
     # Delete stale vectors (in Chroma but no longer in SQLite)
     if deleted_chunk_ids:
         try:
-            await asyncio.to_thread(collection.delete, ids=list(deleted_chunk_ids))
+            from vector_store.chroma import delete as chroma_delete
+
+            await asyncio.to_thread(chroma_delete, list(deleted_chunk_ids))
             logger.info(f"Deleted {len(deleted_chunk_ids)} stale chunks from ChromaDB")
         except Exception as e:
             logger.warning(f"Could not delete stale chunks from ChromaDB: {e}")
@@ -208,77 +449,81 @@ async def embed_chunks_incremental() -> AsyncGenerator[dict, None]:
         f"Embedding {len(chunks_to_embed)} chunks ({len(new_chunk_ids)} new, {len(changed_chunk_ids)} changed)"
     )
 
-    # Process in batches
+    # Load full chunk data from SQLite for just the chunks being embedded. The
+    # ids go in as one JSON array so every group runs the same cached
+    # statement rather than a new IN (?, ?, ...) text per group size.
+    from db.database import fetch_all
+
     chunk_ids_list = list(chunks_to_embed)
-    total_chunks = len(chunk_ids_list)
-    total_batches = (total_chunks + BATCH_SIZE - 1) // BATCH_SIZE
-
-    for batch_idx in range(total_batches):
-        start_idx = batch_idx * BATCH_SIZE
-        end_idx = min(start_idx + BATCH_SIZE, total_chunks)
-        batch_ids = chunk_ids_list[start_idx:end_idx]
-
-        # Build batch data
-        batch_chunks = []
-        batch_contents = []
-
-        for chunk_id in batch_ids:
-            data = chunk_data[chunk_id]
-            chunk = Chunk(
-                chunk_id=chunk_id,
-                chat_id=data["chat_id"],
-                chat_name=data["chat_name"],
-                participants=data["participants"],
-                timestamp_start=data["timestamp_start"],
-                timestamp_end=data["timestamp_end"],
-                message_count=data["message_count"],
-                content=data["content"],
-                content_hash=data["content_hash"],
+    row_groups = await asyncio.gather(
+        *(
+            fetch_all(
+                "SELECT chunk_id, content, content_hash, chat_id, chat_name, "
+                "participants, timestamp_start, timestamp_end, message_count "
+                "FROM chunks WHERE chunk_id IN (SELECT value FROM json_each(?))",
+                (json.dumps(group),),
+            )
+            for group in (
+                chunk_ids_list[i : i + CHUNK_FETCH_BATCH_SIZE]
+                for i in range(0, len(chunk_ids_list), CHUNK_FETCH_BATCH_SIZE)
+            )
+        )
+    )
+    # Batch similarly sized chunks together: the embedder pads each batch to
+    # its longest input, so a mixed batch wastes work on the short ones.
+    rows = sorted(
+        (row for group in row_groups for row in group),
+        key=lambda row: len(row["content"]),
+    )
+    total_chunks = len(rows)
+
+    # Build batch data
+    batches = _pack_batches(
+        [
+            Chunk(
+                chunk_id=row["chunk_id"],
+                chat_id=row["chat_id"],
+                chat_name=row["chat_name"],
+                participants=row["participants"],
+                timestamp_start=row["timestamp_start"],
+                timestamp_end=row["timestamp_end"],
+                message_count=row["message_count"],
+                content=row["content"],
+                content_hash=row["content_hash"],
                 embedding_version=settings.embedding_model,
             )
-            batch_chunks.append(chunk)
-            batch_contents.append(data["content"])
-
-        # Embed the batch
-        try:
-            embeddings = await embed_batch(batch_contents)
-            from vector_store.chroma import upsert as chroma_upsert
-
-            await asyncio.to_thread(chroma_upsert, batch_chunks, embeddings)
-
-            counts["embedded"] += len(batch_chunks)
+            for row in rows
+        ]
+    )
 
-            # Yield progress
-            yield {
-                "type": "progress",
-                "processed_chunks": counts["embedded"],
-                "total_chunks": total_chunks,
-                "message": f"Embedded {counts['embedded']}/{total_chunks} chunks...",
-            }
+    # Embed the batches, several in flight at once. Finished batches are
+    # recorded in SQLite every few batches rather than one commit each.
+    embedded_chunks: list[Chunk] = []
+    async for batch_idx, batch_chunks, error in _embed_batches(batches):
+        if error is not None:
+            error_msg = f"Error embedding batch {batch_idx}: {error}"
+            logger.error(error_msg)
+            counts["errors"] += len(batch_chunks)
+            if "last_error" not in counts:
+                counts["last_error"] = str(error)
+            continue
 
-            # Update embedded_at in SQLite using a batch lock
-            from db.database import _write_lock, get_connection
+        counts["embedded"] += len(batch_chunks)
+        embedded_chunks.extend(batch_chunks)
+        if len(embedded_chunks) >= MARK_EMBEDDED_EVERY * settings.embedding_batch_size:
+            await _mark_embedded(embedded_chunks, int(time.time()))
+            embedded_chunks = []
 
-            async with _write_lock:
-                db = await get_connection()
-                try:
-                    timestamp = int(time.time())
-                    placeholders = ",".join(["?"] * len(batch_ids))
-                    await db.execute(
-                        f"UPDATE chunks SET embedded_at = ?, embedding_version = ? "
-                        f"WHERE chunk_id IN ({placeholders})",
-                        [timestamp, settings.embedding_model] + batch_ids,
-                    )
-                    await db.commit()
-                finally:
-                    await db.close()
+        # Yield progress
+        yield {
+            "type": "progress",
+            "processed_chunks": counts["embedded"],
+            "total_chunks": total_chunks,
+            "message": f"Embedded {counts['embedded']}/{total_chunks} chunks...",
+        }
 
-        except Exception as e:
-            error_msg = f"Error embedding batch {batch_idx}: {e}"
-            logger.error(error_msg)
-            counts["errors"] += len(batch_ids)
-            if "last_error" not in counts:
-                counts["last_error"] = str(e)
+    if embedded_chunks:
+        await _mark_embedded(embedded_chunks, int(time.time()))
 
     yield {"type": "done", **counts}
 
@@ -309,9 +554,6 @@ async def reindex_all() -> AsyncGenerator[dict, None]:
         delete_temp_collection,
         swap_collection,
     )
-    from vector_store.chroma import (
-        upsert as chroma_upsert,
-    )
 
     temp_collection = create_temp_collection()
 
@@ -333,85 +575,66 @@ async def reindex_all() -> AsyncGenerator[dict, None]:
         yield {"type": "done", "embedded": 0, "skipped": 0, "errors": 0}
         return
 
-    # Process in batches
+    # Process in batches of similarly sized chunks (see embed_chunks_incremental)
+    all_rows.sort(key=lambda row: len(row["content"]))
     total_chunks = len(all_rows)
-    total_batches = (total_chunks + BATCH_SIZE - 1) // BATCH_SIZE
+    batches = _pack_batches(
+        [
+            Chunk(
+                chunk_id=row["chunk_id"],
+                content=row["content"],
+                content_hash=row["content_hash"],
+                chat_id=row["chat_id"],
+                chat_name=row["chat_name"],
+                participants=row["participants"],
+                timestamp_start=row["timestamp_start"],
+                timestamp_end=row["timestamp_end"],
+                message_count=row["message_count"],
+                embedding_version=settings.embedding_model,
+            )
+            for row in all_rows
+        ]
+    )
 
     counts = {"embedded": 0, "skipped": 0, "errors": 0}
     timestamp = int(time.time())
 
     try:
-        for batch_idx in range(total_batches):
-            start_idx = batch_idx * BATCH_SIZE
-            end_idx = min(start_idx + BATCH_SIZE, total_chunks)
-            batch_rows = all_rows[start_idx:end_idx]
-
-            batch_chunks = []
-            batch_contents = []
-
-            for row in batch_rows:
-                chunk = Chunk(
-                    chunk_id=row["chunk_id"],
-                    content=row["content"],
-                    content_hash=row["content_hash"],
-                    chat_id=row["chat_id"],
-                    chat_name=row["chat_name"],
-                    participants=row["participants"],
-                    timestamp_start=row["timestamp_start"],
-                    timestamp_end=row["timestamp_end"],
-                    message_count=row["message_count"],
-                    embedding_version=settings.embedding_model,
-                )
-                batch_chunks.append(chunk)
-                batch_contents.append(row["content"])
-
-            # Embed the batch
-            try:
-                embeddings = await embed_batch(batch_contents)
-
-                # Upsert to temporary collection
-                await asyncio.to_thread(
-                    chroma_upsert, batch_chunks, embeddings, collection=temp_collection
-                )
-
-                counts["embedded"] += len(batch_chunks)
-
-                # Yield progress
-                yield {
-                    "type": "progress",
-                    "current": counts["embedded"],
-                    "total": total_chunks,
-                }
-
-                # Update embedded_at in SQLite using a batch lock
-                from db.database import _write_lock, get_connection
-
-                async with _write_lock:
-                    db = await get_connection()
-                    try:
-                        placeholders = ",".join(["?"] * len(batch_chunks))
-                        await db.execute(
-                            f"UPDATE chunks SET embedded_at = ?, embedding_version = ? "
-                            f"WHERE chunk_id IN ({placeholders})",
-                            [timestamp, settings.embedding_model]
-                            + [c.chunk_id for c in batch_chunks],
-                        )
-                        await db.commit()
-                    finally:
-                        await db.close()
-
-            except Exception as e:
-                logger.error(f"Error embedding batch {batch_idx}: {e}")
+        # Embed the batches into the temporary collection, several in flight
+        # at once. Leaving the loop on the first failure cancels the rest.
+        async for batch_idx, batch_chunks, error in _embed_batches(
+            batches, collection=temp_collection
+        ):
+            if error is not None:
+                logger.error(f"Error embedding batch {batch_idx}: {error}")
                 counts["errors"] += len(batch_chunks)
                 # Rollback: delete temp collection and raise
                 delete_temp_collection()
-                raise RuntimeError(f"Reindex failed at batch {batch_idx}: {e}") from e
+                raise RuntimeError(
+                    f"Reindex failed at batch {batch_idx}: {error}"
+                ) from error
+
+            counts["embedded"] += len(batch_chunks)
+
+            # Yield progress
+            yield {
+                "type": "progress",
+                "current": counts["embedded"],
+                "total": total_chunks,
+            }
 
         # All batches succeeded - swap collections
         logger.info(
             f"All {counts['embedded']} chunks embedded successfully - swapping collections"
         )
-        swap_collection()
+        # The swap copies every vector into the live collection; keep that
+        # off the event loop so searches are still served meanwhile.
+        await asyncio.to_thread(swap_collection)
+
+        # The new vectors only went live with the swap, so record them now
+        await _mark_embedded(
+            [chunk for batch_chunks in batches for chunk in batch_chunks], timestamp
+        )
 
         logger.info(
             f"Reindex complete: {counts['embedded']} embedded, {counts['errors']} errors"
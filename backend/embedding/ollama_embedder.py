@@ -3,10 +3,16 @@
 Works with Ollama's /v1 endpoint, OpenRouter, or any OpenAI-compatible provider.
 The embedding_model setting determines which model is used; the base URL is derived
 from ollama_url so the same code supports local Ollama and cloud providers.
+When the server answers Ollama's /api/version, batches go to the native
+/api/embed endpoint instead, which takes the whole batch in one request.
 """
 
-from typing import Optional
+import asyncio
+import time
+from typing import Optional, Union
 
+import httpx
+import numpy as np
 from openai import AsyncOpenAI
 
 from config import settings
@@ -14,10 +20,42 @@ from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Connection pool shared by both clients' settings: keep sockets to the
+# embedding server open between batches (and across concurrent batches)
+# instead of reconnecting for each request.
+_HTTP_LIMITS = httpx.Limits(
+    max_connections=16, max_keepalive_connections=16, keepalive_expiry=300.0
+)
+
 # Cached client — reset to None if settings change
 _client: Optional[AsyncOpenAI] = None
 _client_base_url: str = ""
 
+# Cached client for Ollama's native API, plus whether each base URL serves it
+# (probed once via /api/version). Non-Ollama providers go straight to the
+# OpenAI-compatible path.
+_native_client: Optional[httpx.AsyncClient] = None
+_native_base_url: str = ""
+_native_support: dict[str, bool] = {}
+
+# Model ids last listed by the service: (monotonic time, base URL, ids).
+# check_model_exists answers from this while it is fresh, so a run's
+# connection check and model checks share one models.list() request.
+_MODELS_TTL = 60.0
+_models_cache: tuple[float, str, list[str]] = (0.0, "", [])
+
+# Closes of clients replaced after a URL change, held so they aren't
+# garbage-collected mid-close
+_closing: set[asyncio.Task] = set()
+
+
+def _close_in_background(client: Union[AsyncOpenAI, httpx.AsyncClient]) -> None:
+    """Close a replaced client without blocking the caller."""
+    close = client.close if isinstance(client, AsyncOpenAI) else client.aclose
+    task = asyncio.get_running_loop().create_task(close())
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
 
 def _get_client() -> AsyncOpenAI:
     """Get or create the OpenAI-compatible embedding client.
@@ -31,57 +69,182 @@ def _get_client() -> AsyncOpenAI:
 
     # Re-create if the URL has changed (e.g., settings updated at runtime)
     if _client is None or _client_base_url != base_url:
-        _client = AsyncOpenAI(base_url=base_url, api_key="ollama")
+        if _client is not None:
+            _close_in_background(_client)
+        _client = AsyncOpenAI(
+            base_url=base_url,
+            api_key="ollama",
+            http_client=httpx.AsyncClient(limits=_HTTP_LIMITS, follow_redirects=True),
+        )
         _client_base_url = base_url
         logger.info(f"Embedding client initialized at {base_url}")
 
     return _client
 
 
-def reset_client() -> None:
-    """Force the next call to _get_client() to create a fresh client.
+async def reset_client() -> None:
+    """Close the cached clients so the next call creates fresh ones.
 
     Call this after changing ollama_url in settings.
     """
-    global _client
+    global _client, _native_client, _models_cache
+    client, native_client = _client, _native_client
     _client = None
+    _native_client = None
+    _native_support.clear()
+    _models_cache = (0.0, "", [])
+    if client is not None:
+        await client.close()
+    if native_client is not None:
+        await native_client.aclose()
+
+
+def _get_native_client() -> httpx.AsyncClient:
+    """Get or create the HTTP client for Ollama's native /api endpoints."""
+    global _native_client, _native_base_url
+
+    base_url = settings.ollama_url.rstrip("/")
+    if _native_client is None or _native_base_url != base_url:
+        if _native_client is not None:
+            _close_in_background(_native_client)
+        _native_client = httpx.AsyncClient(
+            base_url=base_url, timeout=60.0, limits=_HTTP_LIMITS
+        )
+        _native_base_url = base_url
+    return _native_client
+
+
+async def _embed_native(texts: list[str], model: str) -> Optional[list[list[float]]]:
+    """Embed a batch via Ollama's /api/embed in a single request.
+
+    Returns None when the server isn't Ollama or its /api/embed can't be used,
+    so the caller can use the OpenAI-compatible endpoint instead. Other
+    Ollama errors, timeouts and connection errors are raised: retrying them
+    on /v1 would only repeat the same work against the same server.
+    """
+    base_url = settings.ollama_url.rstrip("/")
+    if not await _serves_native_api(base_url):
+        return None
 
+    response = await _get_native_client().post(
+        "/api/embed", json={"model": model, "input": texts}
+    )
 
-async def embed_batch(texts: list[str]) -> list[list[float]]:
+    try:
+        data = response.json()
+    except ValueError:
+        data = None
+    if response.is_success and isinstance(data, dict) and "embeddings" in data:
+        return data["embeddings"]
+
+    error = data.get("error") if isinstance(data, dict) else None
+    if response.status_code == 404 and isinstance(error, str) and "not found" in error:
+        # Unknown model: /v1 reports it in the form the UI understands
+        return None
+    if response.is_success or response.status_code in (404, 405):
+        # Ollama too old for /api/embed; don't upload every batch twice
+        logger.info(f"{base_url} has no usable /api/embed; using the /v1 endpoint")
+        _native_support[base_url] = False
+        return None
+
+    raise httpx.HTTPStatusError(
+        f"Embedding request failed ({response.status_code}): "
+        f"{error or response.reason_phrase}",
+        request=response.request,
+        response=response,
+    )
+
+
+async def _serves_native_api(base_url: str) -> bool:
+    """Whether base_url is an Ollama server, probed once via /api/version."""
+    supported = _native_support.get(base_url)
+    if supported is None:
+        response = await _get_native_client().get("/api/version")
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        supported = (
+            response.is_success and isinstance(data, dict) and "version" in data
+        )
+        if not supported:
+            logger.info(f"{base_url} is not Ollama; embedding via the /v1 endpoint")
+        _native_support[base_url] = supported
+    return supported
+
+
+async def embed_batch(texts: list[str]) -> np.ndarray:
     """Embed a batch of text strings via the OpenAI embeddings endpoint.
 
     Args:
         texts: List of strings to embed.
 
     Returns:
-        List of embedding vectors (one per input string).
+        float32 array of shape (len(texts), dim), one row per input string.
     """
     if not texts:
-        return []
+        return np.empty((0, 0), dtype=np.float32)
 
-    client = _get_client()
     model = settings.embedding_model
 
     logger.debug(f"Embedding {len(texts)} texts with model '{model}'")
 
-    response = await client.embeddings.create(model=model, input=texts)
-    embeddings = [item.embedding for item in response.data]
+    embeddings = await _embed_native(texts, model)
+    if embeddings is None:
+        client = _get_client()
+        response = await client.embeddings.create(model=model, input=texts)
+        embeddings = [item.embedding for item in response.data]
+
+    # Pack the vectors once here; a list of Python floats costs ~10x the
+    # memory and ChromaDB converts to an array on upsert anyway.
+    embeddings = np.asarray(embeddings, dtype=np.float32)
 
-    logger.debug(f"Generated {len(embeddings)} embeddings (dim={len(embeddings[0]) if embeddings else 0})")
+    logger.debug(f"Generated {len(embeddings)} embeddings (dim={embeddings.shape[-1]})")
     return embeddings
 
 
 async def embed_single(text: str) -> list[float]:
     """Embed a single text string."""
     embeddings = await embed_batch([text])
-    return embeddings[0] if embeddings else []
+    return embeddings[0].tolist() if len(embeddings) else []
+
+
+async def _list_model_ids() -> list[str]:
+    """List the service's model ids and refresh the cache with them."""
+    global _models_cache
+
+    client = _get_client()
+    response = await client.models.list()
+    model_ids = [m.id for m in response.data]
+    _models_cache = (time.monotonic(), _client_base_url, model_ids)
+    return model_ids
+
+
+def _has_model(model_ids: list[str], model_name: str) -> bool:
+    """Whether model_name matches any of the listed model ids."""
+    # Normalise for comparison
+    want_lower = model_name.lower()
+    want_base = want_lower.split(":")[0]  # strip tag suffix
+
+    for model_id in model_ids:
+        m_id = model_id.lower()
+        m_id_short = m_id.split("/")[-1]   # strip namespace prefix
+        m_id_base = m_id_short.split(":")[0]
+
+        if (
+            m_id == want_lower
+            or m_id_short == want_lower
+            or m_id_short == f"{want_lower}:latest"
+            or m_id_base == want_base
+        ):
+            return True
+    return False
 
 
 async def check_ollama_connection() -> bool:
     """Check if the embedding service (Ollama /v1) is reachable."""
     try:
-        client = _get_client()
-        await client.models.list()
+        await _list_model_ids()
         logger.info("Embedding service connection successful")
         return True
     except Exception as e:
@@ -93,28 +256,21 @@ async def check_model_exists(model_name: str) -> bool:
     """Check if the given embedding model is available on the service.
 
     Handles namespace prefixes (e.g. 'ZimaBlueAI/Qwen3-Embedding-0.6B:Q8_0')
-    and case differences so partial name matches still work.
+    and case differences so partial name matches still work. A model found
+    in a list fetched within the last _MODELS_TTL seconds is trusted without
+    asking again; a miss always re-lists, so a newly pulled model is seen.
     """
     try:
-        client = _get_client()
-        response = await client.models.list()
-
-        # Normalise for comparison
-        want_lower = model_name.lower()
-        want_base = want_lower.split(":")[0]  # strip tag suffix
-
-        for m in response.data:
-            m_id = m.id.lower()
-            m_id_short = m_id.split("/")[-1]   # strip namespace prefix
-            m_id_base = m_id_short.split(":")[0]
-
-            if (
-                m_id == want_lower
-                or m_id_short == want_lower
-                or m_id_short == f"{want_lower}:latest"
-                or m_id_base == want_base
-            ):
-                return True
+        listed_at, base_url, model_ids = _models_cache
+        if (
+            base_url == settings.ollama_url.rstrip("/") + "/v1"
+            and time.monotonic() - listed_at < _MODELS_TTL
+            and _has_model(model_ids, model_name)
+        ):
+            return True
+
+        if _has_model(await _list_model_ids(), model_name):
+            return True
 
         logger.warning(f"Embedding model '{model_name}' not found in available models")
         return False
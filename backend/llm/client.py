@@ -1,15 +1,101 @@
 """Unified LLM client for LifeQuery - supports Ollama, OpenRouter, and Custom OpenAI-compatible endpoints."""
 
-from typing import Any, AsyncGenerator
+import re
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Optional
 
 from config import Settings
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from utils.logger import get_logger
 import httpx
-import json
+
+try:
+    # Installed alongside chromadb; parses Ollama's per-token stream lines
+    # and encodes the (prompt-sized) request bodies several times faster
+    # than the stdlib
+    from orjson import dumps as _json_dumps
+    from orjson import loads as _json_loads
+except ImportError:
+    import json
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+    _json_loads = json.loads
 
 logger = get_logger(__name__)
 
+# A version-like path suffix (e.g. /v1, /v4, /v1beta) on a base URL
+_VERSION_SUFFIX_RE = re.compile(r"/v\d+([a-z0-9_-]*)?$")
+
+# <think> / </think> tags leaked into content by reasoning models
+_THINK_TAG_RE = re.compile(r"</?think>")
+
+# Delta fields that carry reasoning tokens, in lookup order (DeepSeek uses
+# 'reasoning_content', OpenRouter uses 'reasoning')
+_REASONING_KEYS = ("reasoning_content", "reasoning", "thought", "thought_content")
+
+# A client is built per chat request, so the connection pool lives at module
+# level: keep-alive sockets (and their TLS sessions) to the provider are then
+# reused by the next request instead of being opened again each time. Both
+# client classes share it.
+_HTTP_LIMITS = httpx.Limits(
+    max_connections=200, max_keepalive_connections=50, keepalive_expiry=120.0
+)
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Get or create the HTTP client shared by all LLM clients."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = DefaultAsyncHttpxClient(limits=_HTTP_LIMITS)
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client (called on application shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+# Providers whose request extras differ, matched once against the base URL
+_PROVIDER_ZAI = "zai"
+_PROVIDER_MINIMAX = "minimax"
+_PROVIDER_OPENAI = "openai"
+_PROVIDER_OTHER = "other"
+
+
+def _provider_for_url(base_url: str) -> str:
+    if "api.z.ai" in base_url:
+        return _PROVIDER_ZAI
+    if "api.minimax.io" in base_url:
+        return _PROVIDER_MINIMAX
+    if "openai.com" in base_url:
+        return _PROVIDER_OPENAI
+    return _PROVIDER_OTHER
+
+
+async def _iter_ndjson(response: httpx.Response) -> AsyncGenerator[dict[str, Any], None]:
+    """Parse a newline-delimited JSON response body as it streams in.
+
+    Splits the raw bytes on newlines ourselves rather than using
+    aiter_lines(), which decodes to str and tracks line state per chunk;
+    the JSON parser takes the bytes directly.
+    """
+    pending = b""
+    async for data in response.aiter_bytes():
+        lines = (pending + data).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            # isspace() checks for blank lines without copying the line
+            if line and not line.isspace():
+                yield _json_loads(line)
+    if pending and not pending.isspace():
+        yield _json_loads(pending)
+
 
 class OllamaNativeClient:
     """LLM client using Ollama's native API.
@@ -53,55 +139,50 @@ class OllamaNativeClient:
                 payload["include_reasoning"] = True
 
             reasoning_started = False
-            async with httpx.AsyncClient(timeout=120.0) as http_client:
-                async with http_client.stream("POST", url, json=payload) as response:
-                    response.raise_for_status()
-                    async for line in response.aiter_lines():
-                        if not line.strip():
-                            continue
-                            
-                        chunk = json.loads(line)
-                        msg = chunk.get("message", {})
-                        
-                        # Handle reasoning field (Ollama/DeepSeek/Qwen variants)
-                        reasoning = (
-                            msg.get("reasoning", "") or 
-                            msg.get("thinking", "") or 
-                            msg.get("thought", "") or
-                            msg.get("thought_content", "")
-                        )
-                        if reasoning:
-                            if self.enable_thinking:
-                                if not reasoning_started:
-                                    yield "<think>"
-                                    reasoning_started = True
-                                yield reasoning
-                            # If not enabled, we discard tokens in the reasoning field
-                            continue
+            async with _get_http_client().stream(
+                "POST",
+                url,
+                content=_json_dumps(payload),
+                headers={"Content-Type": "application/json"},
+                timeout=120.0,
+            ) as response:
+                response.raise_for_status()
+                async for chunk in _iter_ndjson(response):
+                    msg = chunk.get("message", {})
+                    
+                    # Handle reasoning field (Ollama/DeepSeek/Qwen variants)
+                    reasoning = (
+                        msg.get("reasoning", "") or 
+                        msg.get("thinking", "") or 
+                        msg.get("thought", "") or
+                        msg.get("thought_content", "")
+                    )
+                    if reasoning:
+                        if self.enable_thinking:
+                            if not reasoning_started:
+                                yield "<think>"
+                                reasoning_started = True
+                            yield reasoning
+                        # If not enabled, we discard tokens in the reasoning field
+                        continue
+                    
+                    # Handle main content
+                    content = msg.get("content", "")
+                    if content:
+                        # If we were in reasoning, close the tag before yielding content
+                        if reasoning_started:
+                            yield "</think>"
+                            reasoning_started = False
                         
-                        # Handle main content
-                        content = msg.get("content", "")
+                        # Fallback: if model leaks <think> tags into content (common in Qwen3/DeepSeek)
+                        # and thinking is disabled, we strip them. Only the tags are
+                        # removed; typically Ollama models use the reasoning field.
+                        # Most tokens have no "<" at all, so skip the regex for those.
+                        if not self.enable_thinking and "<" in content:
+                            content = _THINK_TAG_RE.sub("", content)
+
                         if content:
-                            # If we were in reasoning, close the tag before yielding content
-                            if reasoning_started:
-                                yield "</think>"
-                                reasoning_started = False
-                            
-                            # Fallback: if model leaks <think> tags into content (common in Qwen3/DeepSeek)
-                            # and thinking is disabled, we strip them.
-                            if not self.enable_thinking:
-                                if "<think>" in content:
-                                    # Very basic stripping for atomic tag tokens
-                                    content = content.replace("<think>", "")
-                                    # If it also contains the close tag, strip that too
-                                    if "</think>" in content:
-                                        content = content.replace("</think>", "")
-                                    
-                                    # If it's just raw text between tags, it might still leak,
-                                    # but typically Ollama models use reasoning field.
-                            
-                            if content:
-                                yield content
+                            yield content
 
             # Final safety close if stream finishes in reasoning
             if reasoning_started:
@@ -142,9 +223,7 @@ class UnifiedLLMClient:
         # Ensure URL ends with /v1 only if no version is detected
         if base_url:
             base_url = base_url.rstrip("/")
-            # Check if URL already has a version-like suffix (e.g., /v1, /v4, /v1beta)
-            import re
-            if not re.search(r'/v\d+([a-z0-9_-]*)?$', base_url):
+            if not _VERSION_SUFFIX_RE.search(base_url):
                 base_url = base_url + "/v1"
 
         # For Ollama, use empty key if none provided
@@ -156,27 +235,30 @@ class UnifiedLLMClient:
             api_key=api_key,
             timeout=60.0,
             max_retries=2,
+            http_client=_get_http_client(),
         )
 
+        self._provider = _provider_for_url(base_url or "")
+
         logger.info(
             f"UnifiedLLMClient: base_url={base_url}, model={model}, "
             f"temperature={temperature}, max_tokens={max_tokens}"
         )
 
     def _extra_body_for_provider(self) -> dict[str, Any] | None:
-        base_url = str(self.client.base_url)
+        provider = self._provider
         if self.enable_thinking:
-            if "api.z.ai" in base_url:
+            if provider == _PROVIDER_ZAI:
                 return {"think": True}
-            if "api.minimax.io" in base_url:
+            if provider == _PROVIDER_MINIMAX:
                 return {"think": True, "include_reasoning": True, "reasoning_split": True}
             return {"think": True, "thinking": True, "include_reasoning": True}
 
-        if "openai.com" in base_url:
+        if provider == _PROVIDER_OPENAI:
             return None
 
         extra_body = {"include_reasoning": False}
-        if "api.minimax.io" in base_url:
+        if provider == _PROVIDER_MINIMAX:
             extra_body["reasoning_split"] = True
         return extra_body
 
@@ -213,55 +295,49 @@ class UnifiedLLMClient:
             response = await self.client.chat.completions.create(**kwargs)
 
             reasoning_started = False
+            thinking = self.enable_thinking
             async for chunk in response:
                 if not chunk.choices:
                     continue
                     
                 delta = chunk.choices[0].delta
-                
-                # Extract reasoning token (DeepSeek uses 'reasoning_content', OpenRouter uses 'reasoning')
-                reasoning_token = None
-                if hasattr(delta, "reasoning_content") and delta.reasoning_content:
-                    reasoning_token = delta.reasoning_content
-                elif hasattr(delta, "reasoning") and delta.reasoning:
-                    reasoning_token = delta.reasoning
-                elif hasattr(delta, "thought") and delta.thought:
-                    reasoning_token = delta.thought
-                elif hasattr(delta, "thought_content") and delta.thought_content:
-                    reasoning_token = delta.thought_content
-                
-                # Check model_extra just in case the OpenAI client didn't map the attribute
-                if not reasoning_token and hasattr(delta, "model_extra") and delta.model_extra:
-                    reasoning_token = (
-                        delta.model_extra.get("reasoning_content") or 
-                        delta.model_extra.get("reasoning") or
-                        delta.model_extra.get("thought") or
-                        delta.model_extra.get("thought_content")
-                    )
-                
-                if reasoning_token:
-                    if self.enable_thinking:
+
+                # Reasoning tokens are only looked for when they will be shown;
+                # with thinking disabled they are simply discarded
+                if thinking:
+                    # Extract reasoning token
+                    reasoning_token = None
+                    for key in _REASONING_KEYS:
+                        reasoning_token = getattr(delta, key, None)
+                        if reasoning_token:
+                            break
+
+                    # Check model_extra just in case the OpenAI client didn't map the attribute
+                    if not reasoning_token:
+                        model_extra = getattr(delta, "model_extra", None)
+                        if model_extra:
+                            for key in _REASONING_KEYS:
+                                reasoning_token = model_extra.get(key)
+                                if reasoning_token:
+                                    break
+
+                    if reasoning_token:
                         if not reasoning_started:
                             yield "<think>"
                             reasoning_started = True
                         yield reasoning_token
-                    # If not enabled, we simply discard these tokens
-                else:
                     # If we have main content or end of stream, and we were reasoning, close it
-                    if reasoning_started and (delta.content or chunk.choices[0].finish_reason):
+                    elif reasoning_started and (delta.content or chunk.choices[0].finish_reason):
                         yield "</think>"
                         reasoning_started = False
-                
+
                 # Yield main content
                 if delta.content:
                     content = delta.content
                     # Fallback: strip <think> tags if leaked into content while thinking is disabled
-                    if not self.enable_thinking:
-                        if "<think>" in content:
-                            content = content.replace("<think>", "")
-                        if "</think>" in content:
-                            content = content.replace("</think>", "")
-                    
+                    if not thinking and "<" in content:
+                        content = _THINK_TAG_RE.sub("", content)
+
                     if content:
                         yield content
 
@@ -274,6 +350,39 @@ class UnifiedLLMClient:
             raise
 
 
+@dataclass(frozen=True)
+class _ProviderConfig:
+    """How get_llm_client sets up an OpenAI-compatible provider."""
+
+    label: str  # for logging
+    # Used when chat_url is empty or points at another provider; the custom
+    # provider has none and falls back to settings.custom_chat_url instead
+    default_url: str
+    url_rejects: tuple[str, ...]  # chat_url substrings that mean "not ours"
+    default_model: str = ""  # used when chat_model is empty
+
+
+_PROVIDER_CONFIGS = {
+    # OpenRouter: use chat_url if customized, else use default OpenRouter URL
+    "openrouter": _ProviderConfig("OpenRouter", "https://openrouter.ai/api/v1", ("ollama",)),
+    "openai": _ProviderConfig(
+        "OpenAI",
+        "https://api.openai.com/v1",
+        ("ollama", "openrouter", "minimax", "api.z.ai"),
+        "gpt-4o-mini",
+    ),
+    "minimax": _ProviderConfig(
+        "MiniMax", "https://api.minimax.io/v1", ("ollama", "openrouter"), "MiniMax-M2.5"
+    ),
+    "glmai": _ProviderConfig(
+        "GLM", "https://api.z.ai/api/coding/paas/v4", ("ollama", "openrouter"), "glm-4.7"
+    ),
+    # Custom: use chat_url and chat_api_key, falling back to the deprecated
+    # custom_chat_url if chat_url is still the Ollama default
+    "custom": _ProviderConfig("Custom", "", ("ollama",)),
+}
+
+
 def get_llm_client(
     settings: Settings, enable_thinking: bool | None = None
 ) -> UnifiedLLMClient:
@@ -309,99 +418,23 @@ def get_llm_client(
             enable_thinking=thinking,
         )
 
-    elif provider == "openrouter":
-        # OpenRouter: use chat_url if customized, else use default OpenRouter URL
-        url = settings.chat_url
-        if not url or "ollama" in url:
-            url = "https://openrouter.ai/api/v1"
-            
-        api_key = settings.chat_api_key or settings.openrouter_api_key
-        
-        logger.info(f"Creating UnifiedLLMClient for OpenRouter: url={url}, model={model}")
-        return UnifiedLLMClient(
-            base_url=url,
-            api_key=api_key,
-            model=model,
-            temperature=temp,
-            max_tokens=max_tokens,
-            enable_thinking=thinking,
-        )
-
-    elif provider == "openai":
-        # OpenAI: https://api.openai.com/v1
-        url = settings.chat_url
-        if not url or any(x in url for x in ["ollama", "openrouter", "minimax", "api.z.ai"]):
-            url = "https://api.openai.com/v1"
-            
-        api_key = settings.chat_api_key or settings.openrouter_api_key
-        active_model = model if model else "gpt-4o-mini"
-
-        logger.info(f"Creating UnifiedLLMClient for OpenAI: url={url}, model={active_model}")
-        return UnifiedLLMClient(
-            base_url=url,
-            api_key=api_key,
-            model=active_model,
-            temperature=temp,
-            max_tokens=max_tokens,
-            enable_thinking=thinking,
-        )
-
-    elif provider == "minimax":
-        # MiniMax: https://api.minimax.io/v1
-        url = settings.chat_url
-        if not url or "ollama" in url or "openrouter" in url:
-            url = "https://api.minimax.io/v1"
-        
-        api_key = settings.chat_api_key or settings.openrouter_api_key
-        active_model = model if model else "MiniMax-M2.5"
-
-        logger.info(f"Creating UnifiedLLMClient for MiniMax: url={url}, model={active_model}")
-        return UnifiedLLMClient(
-            base_url=url,
-            api_key=api_key,
-            model=active_model,
-            temperature=temp,
-            max_tokens=max_tokens,
-            enable_thinking=thinking,
-        )
-
-    elif provider == "glmai":
-        # Z.AI (GLM): https://api.z.ai/api/coding/paas/v4
-        url = settings.chat_url
-        if not url or "ollama" in url or "openrouter" in url:
-            url = "https://api.z.ai/api/coding/paas/v4"
-            
-        api_key = settings.chat_api_key or settings.openrouter_api_key
-        active_model = model if model else "glm-4.7"
-
-        logger.info(f"Creating UnifiedLLMClient for GLM: url={url}, model={active_model}")
-        return UnifiedLLMClient(
-            base_url=url,
-            api_key=api_key,
-            model=active_model,
-            temperature=temp,
-            max_tokens=max_tokens,
-            enable_thinking=thinking,
-        )
-
-    elif provider == "custom":
-        # Custom: use chat_url and chat_api_key
-        # Fallback to deprecated custom_chat_url if chat_url is still default and custom_chat_url is set
-        url = settings.chat_url
-        if ("ollama" in url or not url) and settings.custom_chat_url:
-            url = settings.custom_chat_url
-            
-        api_key = settings.chat_api_key or settings.openrouter_api_key
-        
-        logger.info(f"Creating UnifiedLLMClient for Custom: url={url}, model={model}")
-        return UnifiedLLMClient(
-            base_url=url,
-            api_key=api_key,
-            model=model,
-            temperature=temp,
-            max_tokens=max_tokens,
-            enable_thinking=thinking,
-        )
-
-    else:
+    config = _PROVIDER_CONFIGS.get(provider)
+    if config is None:
         raise ValueError(f"Unknown chat provider: {provider}")
+
+    url = settings.chat_url
+    if not url or any(x in url for x in config.url_rejects):
+        url = config.default_url or settings.custom_chat_url or url
+
+    api_key = settings.chat_api_key or settings.openrouter_api_key
+    active_model = model or config.default_model
+
+    logger.info(f"Creating UnifiedLLMClient for {config.label}: url={url}, model={active_model}")
+    return UnifiedLLMClient(
+        base_url=url,
+        api_key=api_key,
+        model=active_model,
+        temperature=temp,
+        max_tokens=max_tokens,
+        enable_thinking=thinking,
+    )
@@ -5,15 +5,26 @@ import os
 import time
 from contextlib import asynccontextmanager
 
+from chunker.chunker import shutdown_chunk_pool
 from config import load_from_db
-from db.database import init_db
+from db.database import close_pool, count, execute_fetchone, init_db
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from routers import agent, chat, data, openai_compatible, settings, telegram_auth
+from llm.client import close_http_client
+from routers import (
+    agent,
+    chat,
+    data,
+    models,
+    openai_compatible,
+    settings,
+    telegram_auth,
+)
 from utils.exceptions import LifeQueryError
 from utils.scheduler import auto_sync_worker
 from utils.spa_static import SPAStaticFiles
+from vector_store.chroma import _get_collection
 
 # Configure structured logging
 from utils.logger import get_logger, setup_logging
@@ -25,6 +36,20 @@ setup_logging()
 logger = get_logger(__name__)
 
 
+async def _log_startup_stats() -> None:
+    """Log row and vector counts once the app is up, for startup verification."""
+    try:
+        # ChromaDB count runs in a thread to prevent blocking
+        num_chats, num_messages, num_chunks = await asyncio.gather(
+            count("chats"),
+            count("messages"),
+            asyncio.to_thread(lambda: _get_collection().count()),
+        )
+        logger.info(f"Database Connected | Chats: {num_chats} | Messages: {num_messages} | ChromaDB Chunks: {num_chunks}")
+    except Exception as e:
+        logger.warning(f"Could not verify initial database stats: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan - startup and shutdown."""
@@ -38,20 +63,10 @@ async def lifespan(app: FastAPI):
         # Load settings from database
         await load_from_db()
         
-        # Log startup verification stats
-        try:
-            from db.database import count
-            num_chats = await count("chats")
-            num_messages = await count("messages")
-            
-            # Run ChromaDB count in a thread to prevent blocking
-            from vector_store.chroma import _get_collection
-            num_chunks = await asyncio.to_thread(_get_collection().count)
-            
-            logger.info(f"Database Connected | Chats: {num_chats} | Messages: {num_messages} | ChromaDB Chunks: {num_chunks}")
-        except Exception as e:
-            logger.warning(f"Could not verify initial database stats: {e}")
-            
+        # Log startup verification stats in the background; opening ChromaDB
+        # on a slow mount shouldn't hold up the first request
+        app.state.startup_stats_task = asyncio.create_task(_log_startup_stats())
+
         # Start background schedule sync task
         app.state.auto_sync_task = asyncio.create_task(auto_sync_worker())
         
@@ -80,9 +95,16 @@ async def lifespan(app: FastAPI):
         except asyncio.CancelledError:
             pass
 
+    await close_pool()
+    await close_http_client()
+    shutdown_chunk_pool()
+
 
 app = FastAPI(title="LifeQuery API", lifespan=lifespan)
 
+# (checked_at, result) of the last /api/health probe; swapped as one tuple
+app.state.health_cache = (0.0, None)
+
 # Allow all origins — LifeQuery is self-hosted and access is controlled at
 # the network/API key level, not by origin restrictions.
 app.add_middleware(
@@ -93,8 +115,6 @@ app.add_middleware(
 )
 
 # Include routers
-from routers import models
-
 app.include_router(settings.router)
 app.include_router(telegram_auth.router)
 app.include_router(data.router)
@@ -129,12 +149,12 @@ async def health_check():
     """Health check endpoint - returns status and db connectivity."""
     # Cache the result for 30 seconds to avoid hammering the NAS
     now = time.time()
-    if hasattr(app.state, "health_cache") and app.state.health_cache_time > now - 30:
-        return app.state.health_cache
+    checked_at, cached = app.state.health_cache
+    if cached is not None and checked_at > now - 30:
+        return cached
 
     db_ok = False
     try:
-        from db.database import execute_fetchone
         await execute_fetchone("SELECT 1")
         db_ok = True
     except Exception:
@@ -146,8 +166,7 @@ async def health_check():
         "version": "1.0.0"
     }
     
-    app.state.health_cache = result
-    app.state.health_cache_time = now
+    app.state.health_cache = (now, result)
     return result
 
 
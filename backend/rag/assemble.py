@@ -6,6 +6,8 @@ This module handles:
 - Building the final prompt for the LLM
 """
 
+from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Optional
 
 from chunker.chunker import estimate_tokens
@@ -15,6 +17,30 @@ from vector_store.chroma import RetrievedChunk
 
 logger = get_logger(__name__)
 
+_SECONDS_PER_DAY = 86400
+
+# Reasoning directives prepended to the prompt, by whether thinking is enabled.
+# For models that don't natively use a separate reasoning field (like standard
+# Qwen3, Llama 3), we explicitly ask them to use <think> tags.
+_INSTRUCTION_THINK = (
+    "INSTRUCTION: If you need to reason or think step-by-step, wrap your internal monologue "
+    "entirely within <think> and </think> tags before providing your final answer.\n\n"
+)
+_INSTRUCTION_NO_THINK = (
+    "INSTRUCTION: DO NOT provide internal reasoning or show your thought process. "
+    "Respond directly with the final answer.\n\n"
+)
+_INSTRUCTION_NO_THINK_WITH_CONTEXT = (
+    "INSTRUCTION: DO NOT provide internal reasoning or show your thought process. "
+    "Respond directly with the final answer based on the context.\n\n"
+)
+
+
+@lru_cache(maxsize=4096)
+def _format_utc_day(day: int) -> str:
+    """Format a day number (days since the epoch) as a UTC YYYY-MM-DD date."""
+    return datetime.fromtimestamp(day * _SECONDS_PER_DAY, tz=timezone.utc).strftime("%Y-%m-%d")
+
 
 def build_context(
     chunks: list[RetrievedChunk],
@@ -32,25 +58,25 @@ def build_context(
     Returns:
         Tuple of (context_text, used_chunks, token_count)
     """
-    from datetime import datetime, timezone
-
     token_count = 0
-    # (chunk, formatted_text) — filled in relevance order, do NOT sort input
+    # (chunk, header) — filled in relevance order, do NOT sort input
     selected: list[tuple[RetrievedChunk, str]] = []
 
     for chunk in chunks:
-        start_dt = datetime.fromtimestamp(chunk.timestamp_start, tz=timezone.utc).strftime("%Y-%m-%d")
-        end_dt = datetime.fromtimestamp(chunk.timestamp_end, tz=timezone.utc).strftime("%Y-%m-%d")
+        # Chunks mostly share a handful of days, so format each day once
+        start_dt = _format_utc_day(chunk.timestamp_start // _SECONDS_PER_DAY)
+        end_dt = _format_utc_day(chunk.timestamp_end // _SECONDS_PER_DAY)
         header = f"--- CHAT: {chunk.chat_name or 'Unknown'} | DATES: {start_dt} to {end_dt} ---"
-        chunk_text = f"{header}\n{chunk.content}"
 
-        tokens = estimate_tokens(chunk_text)
+        # Estimated separately so the chunk text is only copied once, into
+        # the final context; the sum is within a token of the joined estimate
+        tokens = estimate_tokens(header) + estimate_tokens(chunk.content)
         if token_count + tokens > context_cap:
             logger.debug(
                 f"Context cap reached: {token_count} tokens, {len(selected)} chunks"
             )
             break
-        selected.append((chunk, chunk_text))
+        selected.append((chunk, header))
         token_count += tokens
 
     if not selected:
@@ -60,7 +86,11 @@ def build_context(
     # Sort selected chunks chronologically for coherent presentation
     selected.sort(key=lambda x: x[0].timestamp_start)
     used_chunks = [c for c, _ in selected]
-    context_text = "\n\n".join(t for _, t in selected)
+    parts = []
+    for chunk, header in selected:
+        parts += (header, "\n", chunk.content, "\n\n")
+    parts.pop()  # no separator after the last chunk
+    context_text = "".join(parts)
 
     logger.debug(
         f"Context assembled: {token_count} tokens, {len(selected)} chunks"
@@ -83,6 +113,18 @@ def build_system_message(context_text: str, custom_prompt: str) -> str:
     return f"{custom_prompt}\n\n--- CONTEXT ---\n{context_text}"
 
 
+def _build_instructed_system_message(
+    context_text: str, custom_prompt: str, enable_thinking: bool
+) -> str:
+    """Build the system message with context and the reasoning instruction."""
+    system_message = build_system_message(context_text, custom_prompt)
+
+    # If thinking is disabled, add a directive to avoid internal reasoning
+    if not enable_thinking:
+        return _INSTRUCTION_NO_THINK_WITH_CONTEXT + system_message
+    return _INSTRUCTION_THINK + system_message
+
+
 def build_messages(
     query_text: str,
     system_message: str,
@@ -135,17 +177,9 @@ def build_no_context_messages(
         )
 
     if not enable_thinking:
-        system_content = (
-            f"INSTRUCTION: DO NOT provide internal reasoning or show your thought process. "
-            f"Respond directly with the final answer.\n\n{system_content}"
-        )
+        system_content = _INSTRUCTION_NO_THINK + system_content
     else:
-        # For models that don't natively use a separate reasoning field (like standard Qwen3, Llama 3),
-        # we explicitly ask them to use <think> tags.
-        system_content = (
-            f"INSTRUCTION: If you need to reason or think step-by-step, wrap your internal monologue "
-            f"entirely within <think> and </think> tags before providing your final answer.\n\n{system_content}"
-        )
+        system_content = _INSTRUCTION_THINK + system_content
 
     # Consistent with build_messages: put system content into user message
     user_content = f"{system_content}\n\nQuestion: {query_text}"
@@ -190,20 +224,10 @@ async def assemble(
         )
         return messages, []
 
-    # Build system message with context
-    system_message = build_system_message(context_text, get_system_prompt())
-
-    # If thinking is disabled, add a directive to avoid internal reasoning
-    if not settings.enable_thinking:
-        system_message = (
-            f"INSTRUCTION: DO NOT provide internal reasoning or show your thought process. "
-            f"Respond directly with the final answer based on the context.\n\n{system_message}"
-        )
-    else:
-        system_message = (
-            f"INSTRUCTION: If you need to reason or think step-by-step, wrap your internal monologue "
-            f"entirely within <think> and </think> tags before providing your final answer.\n\n{system_message}"
-        )
+    # Build system message with context and the reasoning directive
+    system_message = _build_instructed_system_message(
+        context_text, get_system_prompt(), settings.enable_thinking
+    )
 
     # Build final message list
     messages = build_messages(query_text, system_message, conversation_history)
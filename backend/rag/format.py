@@ -5,9 +5,14 @@ This module handles:
 - Converting chunk data to user-friendly formats
 """
 
-from datetime import datetime, timezone
+import re
+from functools import lru_cache
 from typing import Any
 
+from .assemble import _SECONDS_PER_DAY, _format_utc_day
+
+_PLACEHOLDER_RE = re.compile(r"\{(user_name|current_date|context_text)\}")
+
 
 def format_debug(messages: list[dict], user_name: str, current_date: str) -> dict:
     """Format debug info showing full messages sent to LLM.
@@ -20,20 +25,14 @@ def format_debug(messages: list[dict], user_name: str, current_date: str) -> dic
     Returns:
         Debug dict with messages and metadata
     """
-
-    # Replace placeholders for display
-    def replace_placeholders(text: str) -> str:
-        text = text.replace("{user_name}", user_name)
-        text = text.replace("{current_date}", current_date)
-        text = text.replace("{context_text}", "[context would be here]")
-        return text
-
     return {
         "type": "debug",
         "messages": [
             {
                 "role": msg.get("role", "unknown"),
-                "content": replace_placeholders(msg.get("content", "")),
+                "content": _replace_placeholders(
+                    msg.get("content", ""), user_name, current_date
+                ),
             }
             for msg in messages
         ],
@@ -42,6 +41,17 @@ def format_debug(messages: list[dict], user_name: str, current_date: str) -> dic
     }
 
 
+@lru_cache(maxsize=256)
+def _replace_placeholders(text: str, user_name: str, current_date: str) -> str:
+    """Fill prompt placeholders for display in a single pass."""
+    values = {
+        "user_name": user_name,
+        "current_date": current_date,
+        "context_text": "[context would be here]",
+    }
+    return _PLACEHOLDER_RE.sub(lambda m: values[m.group(1)], text)
+
+
 def fmt_date(timestamp: int) -> str:
     """Format a Unix timestamp to a readable date string.
 
@@ -53,8 +63,7 @@ def fmt_date(timestamp: int) -> str:
     """
     if timestamp == 0:
         return "Unknown"
-    dt = datetime.fromtimestamp(timestamp, tz=timezone.utc)
-    return dt.strftime("%Y-%m-%d")
+    return _format_utc_day(int(timestamp) // _SECONDS_PER_DAY)
 
 
 def format_citation(chunk: Any) -> dict[str, Any]:
@@ -66,22 +75,11 @@ def format_citation(chunk: Any) -> dict[str, Any]:
     Returns:
         Citation dict with chat_name, date_range, and participants
     """
-    date_range = f"{fmt_date(chunk.timestamp_start)}–{fmt_date(chunk.timestamp_end)}"
-
-    # Handle participants - could be list or string
-    participants = chunk.participants
-    if isinstance(participants, str):
-        import json
-
-        try:
-            participants = json.loads(participants)
-        except (json.JSONDecodeError, TypeError):
-            participants = []
-
+    # participants is already decoded to a list by vector_store.chroma.query
     return {
         "chat_name": chunk.chat_name or "Unknown",
-        "date_range": date_range,
-        "participants": participants,
+        "date_range": f"{fmt_date(chunk.timestamp_start)}–{fmt_date(chunk.timestamp_end)}",
+        "participants": chunk.participants,
         "content": chunk.content,
     }
 
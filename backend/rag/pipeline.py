@@ -4,9 +4,11 @@ This module provides the main entry point for RAG queries by orchestrating
 the retrieval, assembly, and formatting modules.
 """
 
-from typing import AsyncGenerator
+import asyncio
+import time
+from typing import AsyncGenerator, AsyncIterator
 
-from config import Settings, settings
+from config import Settings, get_current_date, get_user_name, settings
 from embedding.ollama_embedder import check_model_exists
 from llm.client import get_llm_client
 from utils.logger import get_logger
@@ -24,6 +26,75 @@ from .retrieve import retrieve
 logger = get_logger(__name__)
 
 
+async def _coalesce_tokens(
+    tokens: AsyncIterator[str], max_batch: int, flush_ms: int
+) -> AsyncGenerator[str, None]:
+    """Join streamed tokens into larger pieces to cut per-event overhead.
+
+    A batch is flushed once it holds max_batch tokens or its first token has
+    waited flush_ms, whichever comes first; the deadline is enforced with a
+    timer, so a pause in the model's output doesn't hold buffered tokens
+    back. Leftovers are flushed when the stream ends.
+    """
+    if max_batch <= 1:
+        async for token in tokens:
+            yield token
+        return
+
+    flush_after = flush_ms / 1000
+    it = aiter(tokens)
+    buf: list[str] = []
+    deadline = 0.0
+    # Only a non-empty buffer races the next read against its deadline. The
+    # pending read outlives a timeout: cancelling it would tear down the
+    # underlying stream
+    next_token: asyncio.Future | None = None
+    try:
+        while True:
+            if not buf:
+                try:
+                    if next_token is not None:
+                        pending, next_token = next_token, None
+                        token = await pending
+                    else:
+                        token = await anext(it)
+                except StopAsyncIteration:
+                    return
+                buf.append(token)
+                deadline = time.monotonic() + flush_after
+            else:
+                if next_token is None:
+                    next_token = asyncio.ensure_future(anext(it))
+                timeout = max(0.0, deadline - time.monotonic())
+                done, _ = await asyncio.wait({next_token}, timeout=timeout)
+                if not done:
+                    yield "".join(buf)
+                    buf.clear()
+                    continue
+
+                finished, next_token = next_token, None
+                try:
+                    token = finished.result()
+                except StopAsyncIteration:
+                    break
+                except Exception:
+                    # Send what arrived before the failure, then surface it
+                    yield "".join(buf)
+                    buf.clear()
+                    raise
+                buf.append(token)
+
+            if len(buf) >= max_batch:
+                yield "".join(buf)
+                buf.clear()
+    finally:
+        if next_token is not None:
+            next_token.cancel()
+
+    if buf:
+        yield "".join(buf)
+
+
 async def rag_stream_query(
     query_text: str,
     conversation_history: list[dict] | None = None,
@@ -51,6 +122,7 @@ async def rag_stream_query(
     """
     # Use runtime_settings if provided, otherwise fall back to global settings
     active_settings = runtime_settings if runtime_settings is not None else settings
+    retrieve_task = None
 
     try:
         if conversation_history is None:
@@ -58,6 +130,11 @@ async def rag_stream_query(
 
         logger.info(f"Starting RAG query: {query_text[:100]}...")
 
+        # Start retrieval right away so the embedding and vector search
+        # overlap with the model pre-flight check below
+        if active_settings.enable_rag:
+            retrieve_task = asyncio.create_task(retrieve(query_text, active_settings))
+
         # Pre-flight check: is the model available?
         if active_settings.chat_provider == "ollama":
             if not await check_model_exists(active_settings.chat_model):
@@ -70,7 +147,7 @@ async def rag_stream_query(
         chunks = []
         if active_settings.enable_rag:
             try:
-                chunks, included_chat_ids = await retrieve(query_text, active_settings)
+                chunks, included_chat_ids = await retrieve_task
             except Exception as e:
                 logger.error(f"Step 1: Retrieval failed with error: {e}", exc_info=True)
                 # Fallback: if retrieval fails (e.g. embedding model missing),
@@ -97,13 +174,14 @@ async def rag_stream_query(
                 enable_thinking=active_settings.enable_thinking,
             )
             # Emit debug info even for no-context fallback
-            from config import get_current_date, get_user_name
-            user_name = get_user_name()
-            current_date = get_current_date()
-            yield format_debug(messages, user_name, current_date)
-
-            async for token in llm_client.stream_chat(messages):
-                yield format_token(token)
+            yield format_debug(messages, get_user_name(), get_current_date())
+
+            async for text in _coalesce_tokens(
+                llm_client.stream_chat(messages),
+                active_settings.stream_batch_size,
+                active_settings.stream_flush_ms,
+            ):
+                yield format_token(text)
             yield format_citations_event([])
             return
 
@@ -122,18 +200,18 @@ async def rag_stream_query(
             return
 
         # Emit debug info with full messages sent to LLM
-        from config import get_current_date, get_user_name
-
-        user_name = get_user_name()
-        current_date = get_current_date()
-        yield format_debug(messages, user_name, current_date)
+        yield format_debug(messages, get_user_name(), get_current_date())
 
         # Step 3: Stream inference
         logger.debug("Step 3: Streaming inference from LLM")
 
         llm_client = get_llm_client(active_settings)
-        async for token in llm_client.stream_chat(messages):
-            yield format_token(token)
+        async for text in _coalesce_tokens(
+            llm_client.stream_chat(messages),
+            active_settings.stream_batch_size,
+            active_settings.stream_flush_ms,
+        ):
+            yield format_token(text)
 
         # Step 4: Yield citations
         logger.debug("Step 4: Formatting and yielding citations")
@@ -147,3 +225,7 @@ async def rag_stream_query(
         from utils.error_beautifier import beautify_error
 
         yield format_error(beautify_error(e))
+    finally:
+        # Don't leave retrieval running if we bailed out before awaiting it
+        if retrieve_task is not None and not retrieve_task.done():
+            retrieve_task.cancel()
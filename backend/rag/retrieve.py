@@ -6,10 +6,14 @@ This module handles:
 - Filtering by included chats
 """
 
+import asyncio
 import re
+import time
+from collections import OrderedDict
 from datetime import datetime
 from typing import Optional
 
+import numpy as np
 from config import Settings
 from embedding.ollama_embedder import embed_single
 from utils.logger import get_logger
@@ -17,13 +21,54 @@ from vector_store.chroma import RetrievedChunk, query
 
 logger = get_logger(__name__)
 
+# (monotonic time, chat ids) from the last included-chats query. Code that
+# adds chats or changes chats.included calls invalidate_included_chat_ids();
+# the TTL bounds staleness from any writer that doesn't.
+_INCLUDED_TTL = 30.0
+_included_cache: tuple[float, Optional[frozenset[str]]] = (0.0, None)
 
-async def get_included_chat_ids() -> set[str]:
+
+# Recent retrievals, LRU ordered: (embedding model, top_k, normalized query)
+# -> (monotonic time, date range, unit query embedding, chunks). A repeated
+# query skips both the embedding call and the vector search; a query whose
+# embedding is nearly identical to a recent one (same model, top_k and date
+# range) still skips the vector search. Cleared whenever chunks are
+# (re)embedded or the included chats change.
+_QUERY_CACHE_SIZE = 256
+_QUERY_CACHE_TTL = 300.0
+_QUERY_SIMILAR_SCAN = 32
+_QUERY_SIMILARITY = 0.95
+_query_cache: OrderedDict[
+    tuple[str, int, str],
+    tuple[float, tuple[Optional[int], Optional[int]], np.ndarray, list[RetrievedChunk]],
+] = OrderedDict()
+
+
+def invalidate_query_cache() -> None:
+    """Drop cached query embeddings and retrieval results."""
+    _query_cache.clear()
+
+
+def invalidate_included_chat_ids() -> None:
+    """Drop the cached included chat IDs so the next query re-reads them."""
+    global _included_cache
+    _included_cache = (0.0, None)
+    invalidate_query_cache()
+
+
+async def get_included_chat_ids() -> frozenset[str]:
     """Get the set of chat IDs that are included in the index."""
+    global _included_cache
     from db.database import fetch_all
 
+    cached_at, chat_ids = _included_cache
+    if chat_ids is not None and time.monotonic() - cached_at < _INCLUDED_TTL:
+        return chat_ids
+
     rows = await fetch_all("SELECT chat_id FROM chats WHERE included = 1")
-    return {row["chat_id"] for row in rows if row["chat_id"]}
+    chat_ids = frozenset(row["chat_id"] for row in rows if row["chat_id"])
+    _included_cache = (time.monotonic(), chat_ids)
+    return chat_ids
 
 
 async def embed_query(query_text: str) -> list[float]:
@@ -41,7 +86,7 @@ async def embed_query(query_text: str) -> list[float]:
 async def retrieve_chunks(
     query_embedding: list[float],
     top_k: int,
-    included_chat_ids: Optional[set[str]] = None,
+    included_chat_ids: Optional[frozenset[str]] = None,
     where: Optional[dict] = None,
 ) -> list[RetrievedChunk]:
     """Retrieve relevant chunks from vector store.
@@ -67,48 +112,49 @@ async def retrieve_chunks(
     return results
 
 
+_MONTHS = {
+    "january": 1,
+    "february": 2,
+    "march": 3,
+    "april": 4,
+    # "may" intentionally omitted — it's a common modal verb ("I may have...")
+    # and causes false-positive month filters on unrelated queries.
+    # Users should include the year ("May 2024") for precise filtering.
+    "june": 6,
+    "july": 7,
+    "august": 8,
+    "september": 9,
+    "october": 10,
+    "november": 11,
+    "december": 12,
+    "jan": 1,
+    "feb": 2,
+    "mar": 3,
+    "apr": 4,
+    "jun": 6,
+    "jul": 7,
+    "aug": 8,
+    "sep": 9,
+    "oct": 10,
+    "nov": 11,
+    "dec": 12,
+}
+# Longest names first so "june" wins over "jun" inside the alternation
+_MONTH_RE = re.compile(r"\b(" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\b")
+_YEAR_RE = re.compile(r"\b(20\d{2})\b")
+
+
 def parse_date_range(query: str):
     """Extremely basic month/year extractor for metadata filtering.
     Detects patterns like 'November' or 'Nov 2024'.
     """
-    months = {
-        "january": 1,
-        "february": 2,
-        "march": 3,
-        "april": 4,
-        # "may" intentionally omitted — it's a common modal verb ("I may have...")
-        # and causes false-positive month filters on unrelated queries.
-        # Users should include the year ("May 2024") for precise filtering.
-        "june": 6,
-        "july": 7,
-        "august": 8,
-        "september": 9,
-        "october": 10,
-        "november": 11,
-        "december": 12,
-        "jan": 1,
-        "feb": 2,
-        "mar": 3,
-        "apr": 4,
-        "jun": 6,
-        "jul": 7,
-        "aug": 8,
-        "sep": 9,
-        "oct": 10,
-        "nov": 11,
-        "dec": 12,
-    }
-
     query = query.lower()
-    found_month = None
     found_year = None
 
-    for m_name, m_num in months.items():
-        if re.search(rf"\b{m_name}\b", query):
-            found_month = m_num
-            break
+    month_match = _MONTH_RE.search(query)
+    found_month = _MONTHS[month_match.group(1)] if month_match else None
 
-    year_match = re.search(r"\b(20\d{2})\b", query)
+    year_match = _YEAR_RE.search(query)
     if year_match:
         found_year = int(year_match.group(1))
     else:
@@ -143,7 +189,7 @@ def parse_date_range(query: str):
 async def retrieve(
     query_text: str,
     settings: Settings,
-) -> tuple[list[RetrievedChunk], set[str]]:
+) -> tuple[list[RetrievedChunk], frozenset[str]]:
     """Main retrieval entry point - embed query and retrieve chunks.
 
     This is a convenience function that combines embedding and retrieval
@@ -156,9 +202,6 @@ async def retrieve(
     Returns:
         Tuple of (retrieved_chunks, included_chat_ids)
     """
-    # Get included chat IDs
-    included_chat_ids = await get_included_chat_ids()
-
     # Detect date filters in query
     start_ts, end_ts = parse_date_range(query_text)
     where = None
@@ -170,12 +213,68 @@ async def retrieve(
             ]
         }
 
-    # Embed query
-    query_embedding = await embed_query(query_text)
-
-    # Retrieve chunks
-    chunks = await retrieve_chunks(
-        query_embedding, settings.top_k * 3, included_chat_ids, where=where
+    top_k = settings.top_k * 3
+    key = (settings.embedding_model, top_k, " ".join(query_text.lower().split()))
+    now = time.monotonic()
+    cached = _query_cache.get(key)
+    if cached is not None and now - cached[0] < _QUERY_CACHE_TTL:
+        _query_cache.move_to_end(key)
+        return list(cached[3]), await get_included_chat_ids()
+
+    # Included chat IDs and the query embedding are independent
+    included_chat_ids, query_embedding = await asyncio.gather(
+        get_included_chat_ids(), embed_query(query_text)
     )
-
-    return chunks, included_chat_ids
+    vector = np.asarray(query_embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    if norm:
+        vector /= norm
+
+    similar = _find_similar_query(key, (start_ts, end_ts), vector, now)
+    if similar is not None:
+        # Inherit the source entry's time and vector, so a chain of
+        # near-duplicates can neither extend its TTL nor drift from it
+        cached_at, vector, chunks = similar
+    else:
+        cached_at = now
+        chunks = await retrieve_chunks(
+            query_embedding, top_k, included_chat_ids, where=where
+        )
+
+    _query_cache[key] = (cached_at, (start_ts, end_ts), vector, chunks)
+    _query_cache.move_to_end(key)
+    while len(_query_cache) > _QUERY_CACHE_SIZE:
+        _query_cache.popitem(last=False)
+
+    return list(chunks), included_chat_ids
+
+
+def _find_similar_query(
+    key: tuple[str, int, str],
+    date_range: tuple[Optional[int], Optional[int]],
+    vector: np.ndarray,
+    now: float,
+) -> Optional[tuple[float, np.ndarray, list[RetrievedChunk]]]:
+    """Return (cached_at, vector, chunks) of a recent, nearly identical query, if any."""
+    model, top_k, _ = key
+    candidates = []
+    for (c_model, c_top_k, _), entry in reversed(_query_cache.items()):
+        if len(candidates) >= _QUERY_SIMILAR_SCAN:
+            break
+        cached_at, c_range, c_vector, c_chunks = entry
+        if (
+            c_model == model
+            and c_top_k == top_k
+            and c_range == date_range
+            and c_vector.shape == vector.shape
+            and now - cached_at < _QUERY_CACHE_TTL
+        ):
+            candidates.append((cached_at, c_vector, c_chunks))
+    if not candidates:
+        return None
+
+    scores = np.stack([c_vector for _, c_vector, _ in candidates]) @ vector
+    best = int(np.argmax(scores))
+    if scores[best] >= _QUERY_SIMILARITY:
+        return candidates[best]
+    return None
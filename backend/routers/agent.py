@@ -278,11 +278,14 @@ def _build_chunk_where(request: AgentChunkQueryRequest) -> tuple[str, list[Any]]
         clauses.append("COALESCE(c.included, 1) = 1")
 
     if request.sender_names:
-        participant_clauses = []
-        for name in request.sender_names:
-            participant_clauses.append("ch.participants LIKE ?")
-            params.append(f"%{name}%")
-        clauses.append(f"({' OR '.join(participant_clauses)})")
+        # chunk_participants is keyed by (participant, chunk_id), so this is an
+        # index lookup per name instead of a LIKE scan over every chunk's JSON.
+        placeholders = ", ".join(["?"] * len(request.sender_names))
+        clauses.append(
+            "ch.chunk_id IN (SELECT chunk_id FROM chunk_participants "
+            f"WHERE participant IN ({placeholders}))"
+        )
+        params.extend(request.sender_names)
 
     if request.text_query:
         clauses.append("LOWER(ch.content) LIKE ?")
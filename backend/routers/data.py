@@ -15,9 +15,11 @@ from db.database import (
     fetch_one,
     get_connection,
     get_db,
+    transaction,
 )
 from embedding import embed_chunks_incremental, reindex_all
 from fastapi import APIRouter, Body, File, Form, HTTPException, UploadFile
+from rag.retrieve import invalidate_included_chat_ids, invalidate_query_cache
 from schemas import (
     ChatBulkActionRequest,
     ChatUpdateRequest,
@@ -103,6 +105,7 @@ async def update_chat(chat_id: str, request: ChatUpdateRequest = Body(...)) -> d
                 "UPDATE chats SET included = ? WHERE chat_id = ?",
                 (1 if request.included else 0, chat_id),
             )
+            invalidate_included_chat_ids()
         if request.chat_name is not None:
             new_name = request.chat_name.strip()
             if not new_name:
@@ -230,14 +233,15 @@ async def _delete_chat_internal(
             await db.commit()
         finally:
             await db.close()
+    invalidate_included_chat_ids()
 
     # 5. Chroma cleanup
     if chunk_ids:
-        from vector_store.chroma import _get_collection
+        from vector_store.chroma import delete as chroma_delete
 
         def _chroma_delete():
             try:
-                _get_collection().delete(ids=chunk_ids)
+                chroma_delete(chunk_ids)
             except Exception as exc:
                 logger.warning(f"ChromaDB delete error for {chat_id}: {exc}")
 
@@ -300,6 +304,7 @@ async def bulk_chat_action(request: ChatBulkActionRequest = Body(...)) -> dict:
             f"UPDATE chats SET included = ? WHERE chat_id IN ({placeholders})",
             (1 if action == "include" else 0, *chat_ids),
         )
+        invalidate_included_chat_ids()
         processed = len(chat_ids)
     else:
         # delete / exclude_and_delete: fetch the live dialog list once for the
@@ -521,6 +526,7 @@ async def sync_chats_generator() -> AsyncGenerator[ServerSentEvent, None]:
                 raise
             finally:
                 await db.close()
+                invalidate_included_chat_ids()
 
         await client.disconnect()
 
@@ -685,8 +691,12 @@ async def sync_generator() -> AsyncGenerator[ServerSentEvent, None]:
         return
 
     async with _sync_lock:
-        async for event in _sync_generator_inner():
-            yield event
+        try:
+            async for event in _sync_generator_inner():
+                yield event
+        finally:
+            # Cached query results may point at replaced or missing vectors
+            invalidate_query_cache()
 
 
 async def _sync_generator_inner() -> AsyncGenerator[ServerSentEvent, None]:
@@ -814,8 +824,11 @@ async def start_process():
             yield create_error_event("A sync or process operation is already in progress.")
             return
         async with _sync_lock:
-            async for event in _process_generator_inner():
-                yield event
+            try:
+                async for event in _process_generator_inner():
+                    yield event
+            finally:
+                invalidate_query_cache()
 
     return EventSourceResponse(process_generator(), headers={"X-Accel-Buffering": "no"})
 
@@ -1061,8 +1074,11 @@ async def reindex_generator() -> AsyncGenerator[ServerSentEvent, None]:
         yield create_error_event("A sync or process operation is already in progress.")
         return
     async with _sync_lock:
-        async for event in _reindex_generator_inner():
-            yield event
+        try:
+            async for event in _reindex_generator_inner():
+                yield event
+        finally:
+            invalidate_query_cache()
 
 
 async def _reindex_generator_inner() -> AsyncGenerator[ServerSentEvent, None]:
@@ -1080,8 +1096,11 @@ async def _reindex_generator_inner() -> AsyncGenerator[ServerSentEvent, None]:
             # otherwise every already-chunked chat looks "up to date" and a
             # reindex silently produces almost no chunks.
             yield create_progress_event("reindex", "Clearing old chunks...")
-            await execute_write("DELETE FROM chunks")
-            await execute_write("UPDATE chats SET last_chunked_at = NULL")
+            # One transaction so a failure can't leave the chunks gone but
+            # the watermarks intact.
+            async with transaction() as db:
+                await db.execute("DELETE FROM chunks")
+                await db.execute("UPDATE chats SET last_chunked_at = NULL")
 
             async for event in chunk_messages_streaming():
                 if event.get("type") == "progress":
@@ -85,7 +85,7 @@ async def update_settings(updates: SettingsUpdate) -> SettingsUpdateResponse:
         if "ollama_url" in update_dict or "embedding_model" in update_dict:
             from embedding.ollama_embedder import reset_client
 
-            reset_client()
+            await reset_client()
         return SettingsUpdateResponse()
     except Exception as e:
         logger.error(f"Error saving settings: {e}")
@@ -333,39 +333,12 @@ async def _import_chat_messages(
 
 async def _insert_message_batch(messages: list) -> dict:
     """Insert a batch of messages into the database."""
-    from db.database import get_connection, _write_lock
-    async with _write_lock:
-        db = await get_connection()
-        try:
-            imported = 0
-            skipped = 0
-
-            await db.execute("BEGIN")
-
-            for msg in messages:
-                try:
-                    await db.execute(
-                        """INSERT OR IGNORE INTO messages
-                           (message_id, chat_id, chat_name, sender_id, sender_name,
-                            is_forwarded, forward_sender_id, forward_sender_name, forward_date,
-                            forward_chat_id, forward_message_id, text, timestamp, source, imported_at)
-                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                        msg,
-                    )
-                    cursor = await db.execute("SELECT changes()")
-                    row = await cursor.fetchone()
-                    if row and row[0] > 0:
-                        imported += 1
-                    else:
-                        skipped += 1
-                except Exception as e:
-                    logger.debug(f"Error inserting message: {e}")
-                    skipped += 1
+    from db.database import insert_messages
 
-            await db.commit()
-            return {"imported": imported, "skipped": skipped}
-        finally:
-            await db.close()
+    # One executemany in one transaction; INSERT OR IGNORE drops duplicates,
+    # so whatever wasn't inserted was already stored.
+    imported = await insert_messages(messages)
+    return {"imported": imported, "skipped": len(messages) - imported}
 
 
 async def _update_chat_entry(
@@ -417,3 +390,9 @@ async def _update_chat_entry(
             await db.commit()
         finally:
             await db.close()
+
+    if not existing:
+        # New chats start out included
+        from rag.retrieve import invalidate_included_chat_ids
+
+        invalidate_included_chat_ids()
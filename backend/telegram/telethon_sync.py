@@ -8,7 +8,7 @@ from typing import Any, AsyncGenerator, Optional
 
 import aiosqlite
 from config import settings
-from db.database import execute_fetchone, execute_write, get_connection
+from db.database import execute_fetchone, execute_write
 from telethon import TelegramClient, errors, utils as telethon_utils
 from telethon.sessions import StringSession
 from telethon.tl.types import Channel, Chat, User
@@ -560,55 +560,75 @@ async def sync_telegram_messages(
                 write_batch_size = min(max(1, settings.telegram_fetch_batch), 250)
 
                 try:
-                    from db.database import _write_lock
+                    from db.database import execute_fetchall, insert_messages
 
                     # Stream messages from Telegram and flush them to SQLite in small
                     # batches so we never retain a full dialog in memory.
                     fetched_batch = []
 
                     async def flush_batch(batch: list) -> None:
-                        nonlocal chat_messages, last_timestamp, total_messages, skipped_duplicate
+                        nonlocal chat_messages, last_timestamp, total_messages
+                        nonlocal skipped_duplicate, skipped_empty
 
                         if not batch:
                             return
 
-                        async with _write_lock:
-                            db = await get_connection()
-                            try:
-                                await db.execute("BEGIN")
-                                for message in batch:
-                                    sender_name = _derive_sender_name(message.sender)
-                                    sender_id = (
-                                        str(getattr(message.sender, "id", ""))
-                                        if message.sender
-                                        else ""
+                        try:
+                            # Skip already-stored messages with one lookup, then
+                            # insert the rest with a single executemany. Rows are
+                            # built before any write lock is taken because
+                            # resolving forward provenance can hit the network.
+                            ids = [str(message.id) for message in batch]
+                            placeholders = ", ".join("?" * len(ids))
+                            existing = {
+                                row[0]
+                                for row in await execute_fetchall(
+                                    "SELECT message_id FROM messages "
+                                    f"WHERE chat_id = ? AND message_id IN ({placeholders})",
+                                    (chat_id, *ids),
+                                )
+                            }
+                            imported_at = int(time.time())
+                            rows = []
+                            for message_id, message in zip(ids, batch):
+                                if message_id in existing:
+                                    skipped_duplicate += 1
+                                    continue
+                                if not message.text.strip():
+                                    skipped_empty += 1
+                                    continue
+                                sender = message.sender
+                                forward_info = await _extract_forward_info(message, client)
+                                rows.append(
+                                    (
+                                        message_id,
+                                        chat_id,
+                                        chat_name,
+                                        str(getattr(sender, "id", "")) if sender else "",
+                                        _derive_sender_name(sender),
+                                        int(forward_info["is_forwarded"]),
+                                        forward_info["forward_sender_id"],
+                                        forward_info["forward_sender_name"],
+                                        forward_info["forward_date"],
+                                        forward_info["forward_chat_id"],
+                                        forward_info["forward_message_id"],
+                                        message.text,
+                                        int(message.date.timestamp()),
+                                        "telegram",
+                                        imported_at,
                                     )
-                                    forward_info = await _extract_forward_info(message, client)
-
-                                    inserted = await _insert_message(
-                                        message_id=str(message.id),
-                                        chat_id=chat_id,
-                                        chat_name=chat_name,  # type: ignore[arg-type]
-                                        sender_id=sender_id,
-                                        sender_name=sender_name,
-                                        text=message.text,
-                                        timestamp=int(message.date.timestamp()),
-                                        **forward_info,
-                                        db=db,
-                                    )
-
-                                    if inserted:
-                                        total_messages += 1
-                                        chat_messages += 1
-                                        last_timestamp = int(message.date.timestamp())
-                                    else:
-                                        skipped_duplicate += 1
-                                await db.commit()
-                            except Exception as e:
-                                await db.rollback()
-                                logger.error(f"Error batch inserting for {chat_name}: {e}")
-                            finally:
-                                await db.close()
+                                )
+
+                            inserted = await insert_messages(rows)
+                            total_messages += inserted
+                            chat_messages += inserted
+                            skipped_duplicate += len(rows) - inserted
+                            if inserted:
+                                last_timestamp = max(
+                                    last_timestamp, max(row[12] for row in rows)
+                                )
+                        except Exception as e:
+                            logger.error(f"Error batch inserting for {chat_name}: {e}")
 
                     async for message in client.iter_messages(
                         dialog.entity,
@@ -762,6 +782,10 @@ async def ensure_chat_entry(
             """,
             (chat_id, chat_name, chat_type, message_count or 0, last_message_at or 0, created_at),
         )
+        # New chats start out included
+        from rag.retrieve import invalidate_included_chat_ids
+
+        invalidate_included_chat_ids()
 
 
 async def _get_chat_message_count(chat_id: str) -> int:
@@ -160,7 +160,8 @@ class TestAgentApi:
         assert data["count"] == 1
         assert data["chunks"][0]["participants"] == ["Person A", "Person B"]
         assert data["chunks"][0]["content"] is None
-        assert "ch.participants LIKE ?" in mock_fetch.call_args.args[0]
+        assert "FROM chunk_participants" in mock_fetch.call_args.args[0]
+        assert "Alex" in mock_fetch.call_args.args[1]
 
     def test_summary_uses_matching_messages_and_llm(self):
         rows = [
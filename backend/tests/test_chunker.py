@@ -1,19 +1,30 @@
 """Unit tests for the chunking engine."""
 
+from dataclasses import replace
+from unittest.mock import patch
+
 import pytest
 from chunker.chunker import (
     CHUNK_MIN_TOKENS,
     GAP_HARD_SECONDS,
     GAP_SOFT_SECONDS,
     Chunk,
+    Msg,
+    _plan_spans,
     chunk_chat,
     compute_content_hash,
     estimate_tokens,
     format_message,
 )
+from config import settings
 # chunk_target is now used for soft-break threshold (default 1000 in settings)
 
 
+def to_msgs(messages: list[dict]) -> list[Msg]:
+    """Build chunker input records from plain message dicts."""
+    return [Msg(**m) for m in messages]
+
+
 class TestEstimateTokens:
     """Tests for the token estimation function."""
 
@@ -33,6 +44,17 @@ class TestEstimateTokens:
         # 8 words -> 10.8 tokens -> 10
         assert estimate_tokens(text) == 10
 
+    def test_newline_separated_words(self):
+        # "hello\nworld test" -> 3 words -> 4.05 tokens -> 4
+        assert estimate_tokens("hello\nworld test") == 4
+
+    def test_surrounding_and_repeated_whitespace(self):
+        # Counts match str.split(): whitespace runs add no phantom words
+        assert estimate_tokens("  hi ") == 1
+        assert estimate_tokens("   \n ") == 0
+        assert estimate_tokens("hello  world\n\ntest") == 4
+        assert estimate_tokens("hello\tworld\r\ntest") == 4
+
 
 class TestFormatMessage:
     """Tests for message formatting."""
@@ -86,7 +108,7 @@ class TestChunkChat:
                 "timestamp": 1699030920,
             }
         ]
-        result = chunk_chat(messages)
+        result = chunk_chat(to_msgs(messages))
         assert len(result) == 1
         assert result[0].message_count == 1
         assert result[0].chat_id == "chat1"
@@ -107,7 +129,7 @@ class TestChunkChat:
             }
             for i in range(10)
         ]
-        result = chunk_chat(messages)
+        result = chunk_chat(to_msgs(messages))
         # All messages should be in one chunk
         assert len(result) == 1
         assert result[0].message_count == 10
@@ -147,7 +169,7 @@ class TestChunkChat:
             }
         )
 
-        result = chunk_chat(messages)
+        result = chunk_chat(to_msgs(messages))
         # Should have 2 chunks due to soft break
         assert len(result) == 2
 
@@ -179,7 +201,7 @@ class TestChunkChat:
             }
         )
 
-        result = chunk_chat(messages)
+        result = chunk_chat(to_msgs(messages))
         # Should have 1 chunk (continues because content is small)
         assert len(result) == 1
         assert result[0].message_count == 2
@@ -212,7 +234,7 @@ class TestChunkChat:
             }
         )
 
-        result = chunk_chat(messages)
+        result = chunk_chat(to_msgs(messages))
         # Should have 2 chunks due to hard break
         assert len(result) == 2
 
@@ -236,7 +258,7 @@ class TestChunkChat:
             for i in range(100)
         ]
 
-        result = chunk_chat(messages)
+        result = chunk_chat(to_msgs(messages))
         assert len(result) > 1
         # Each chunk must be internally consistent
         for chunk in result:
@@ -280,12 +302,63 @@ class TestChunkChat:
             },
         ]
 
-        result = chunk_chat(messages)
+        result = chunk_chat(to_msgs(messages))
         assert len(result) == 1
         participants = result[0].participants
-        assert "Alice" in participants
-        assert "Bob" in participants
-        assert "Charlie" in participants
+        assert participants == ["Alice", "Bob", "Charlie"]
+
+    def test_noise_filter_skips_keyword_messages(self):
+        """Messages containing any noise keyword (case-insensitive) are dropped."""
+        noisy_settings = replace(settings, noise_filter_keywords="spam, a.b")
+        base_time = 1699030920
+        texts = ["Hello", "Buy SPAM now", "axb", "see a.b"]
+        messages = [
+            {
+                "message_id": str(i),
+                "chat_id": "chat1",
+                "chat_name": "Test Chat",
+                "sender_id": "user1",
+                "sender_name": "Alice",
+                "text": text,
+                "timestamp": base_time + (i * 60),
+            }
+            for i, text in enumerate(texts)
+        ]
+
+        with patch("chunker.chunker.settings", noisy_settings):
+            result = chunk_chat(to_msgs(messages))
+        assert len(result) == 1
+        assert result[0].message_count == 2
+        assert "SPAM" not in result[0].content
+        assert "axb" in result[0].content
+
+
+class TestPlanSpans:
+    """Tests for the integer chunk-boundary planner."""
+
+    def test_empty(self):
+        assert _plan_spans([], [], 1000, 1500, 250) == []
+
+    def test_hard_break(self):
+        timestamps = [0, 60, 60 + GAP_HARD_SECONDS + 1]
+        assert _plan_spans(timestamps, [10, 10, 10], 1000, 1500, 250) == [
+            (0, 2),
+            (2, 3),
+        ]
+
+    def test_soft_break_requires_target(self):
+        timestamps = [0, GAP_SOFT_SECONDS + 1]
+        assert _plan_spans(timestamps, [10, 10], 1000, 1500, 250) == [(0, 2)]
+        assert _plan_spans(timestamps, [1000, 10], 1000, 1500, 250) == [
+            (0, 1),
+            (1, 2),
+        ]
+
+    def test_max_split_carries_overlap(self):
+        # Four 100-token messages with chunk_max=400: split after two, carry
+        # back the last message of the first half (100 <= overlap of 150).
+        spans = _plan_spans([0, 60, 120, 180], [100] * 4, 1000, 400, 150)
+        assert spans == [(0, 2), (1, 4)]
 
 
 class TestConstants:
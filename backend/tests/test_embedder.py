@@ -6,6 +6,7 @@ import sys
 import time
 from unittest.mock import AsyncMock, MagicMock, patch
 
+import httpx
 import pytest
 
 # Real ollama and chromadb available on nexus server
@@ -157,6 +158,24 @@ async def test_get_embedded_versions() -> None:
         assert versions == {"chunk1": "model1", "chunk2": "model2"}
 
 
+@pytest.mark.asyncio
+async def test_get_embedded_versions_stops_at_mismatch() -> None:
+    """Test paging stops once a page holds a version other than the current one."""
+    with patch("vector_store.chroma._get_collection") as mock_get_collection:
+        mock_collection = MagicMock()
+        mock_collection.count.return_value = 50_000
+        mock_collection.get.return_value = {
+            "ids": ["chunk1"],
+            "metadatas": [{"embedding_version": "old-model"}],
+        }
+        mock_get_collection.return_value = mock_collection
+
+        versions = await get_embedded_versions(until_mismatch="new-model")
+
+        assert versions == {"chunk1": "old-model"}
+        assert mock_collection.get.call_count == 1
+
+
 @pytest.mark.asyncio
 async def test_check_embedding_version_mismatch_no_embeddings() -> None:
     """Test version check when no embeddings exist yet."""
@@ -231,9 +250,85 @@ async def test_embed_batch() -> None:
 
 @pytest.mark.asyncio
 async def test_embed_batch_empty() -> None:
-    """Test embedding an empty batch returns empty list."""
+    """Test embedding an empty batch returns an empty array."""
     embeddings = await embed_batch([])
-    assert embeddings == []
+    assert len(embeddings) == 0
+
+
+def _native_client_for(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url="http://localhost", transport=httpx.MockTransport(handler)
+    )
+
+
+@pytest.mark.asyncio
+async def test_embed_native_timeout_does_not_fall_back() -> None:
+    """A native /api/embed timeout is raised instead of re-sent to /v1."""
+    from embedding import ollama_embedder
+
+    def handler(request):
+        if request.url.path == "/api/version":
+            return httpx.Response(200, json={"version": "0.5.0"})
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    with patch.object(
+        ollama_embedder, "_get_native_client", return_value=_native_client_for(handler)
+    ), patch("embedding.ollama_embedder._get_client") as mock_get_client:
+        ollama_embedder._native_support.clear()
+        with pytest.raises(httpx.ReadTimeout):
+            await embed_batch(["text1"])
+        ollama_embedder._native_support.clear()
+
+    mock_get_client.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_embed_native_skipped_for_non_ollama_servers() -> None:
+    """A server that fails the /api/version probe never gets /api/embed posts."""
+    from embedding import ollama_embedder
+
+    paths = []
+
+    def handler(request):
+        paths.append(request.url.path)
+        return httpx.Response(404, json={"error": {"message": "File Not Found"}})
+
+    client = _native_client_for(handler)
+    with patch.object(ollama_embedder, "_get_native_client", return_value=client):
+        ollama_embedder._native_support.clear()
+        assert await ollama_embedder._embed_native(["text1"], "model1") is None
+        assert await ollama_embedder._embed_native(["text2"], "model1") is None
+        ollama_embedder._native_support.clear()
+
+    assert paths == ["/api/version"]
+
+
+@pytest.mark.asyncio
+async def test_embed_native_ollama_errors() -> None:
+    """Ollama's unknown-model 404 falls back to /v1; other errors are raised."""
+    from embedding import ollama_embedder
+
+    responses = iter(
+        [
+            httpx.Response(503, text="<html>proxy</html>"),
+            httpx.Response(404, json={"error": 'model "model1" not found'}),
+        ]
+    )
+
+    def handler(request):
+        if request.url.path == "/api/version":
+            return httpx.Response(200, json={"version": "0.5.0"})
+        return next(responses)
+
+    base_url = config_settings.ollama_url.rstrip("/")
+    client = _native_client_for(handler)
+    with patch.object(ollama_embedder, "_get_native_client", return_value=client):
+        ollama_embedder._native_support.clear()
+        with pytest.raises(httpx.HTTPStatusError):
+            await ollama_embedder._embed_native(["text1"], "model1")
+        assert await ollama_embedder._embed_native(["text1"], "model1") is None
+        assert ollama_embedder._native_support[base_url] is True
+        ollama_embedder._native_support.clear()
 
 
 @pytest.mark.asyncio
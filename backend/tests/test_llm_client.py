@@ -16,6 +16,25 @@ class EmptyAsyncStream:
         raise StopAsyncIteration
 
 
+class ListAsyncStream:
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+
+def _content_chunk(content: str) -> SimpleNamespace:
+    delta = SimpleNamespace(content=content, model_extra=None)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)])
+
+
 def _client_for(base_url: str, *, enable_thinking: bool) -> UnifiedLLMClient:
     client = UnifiedLLMClient(
         base_url=base_url,
@@ -72,3 +91,18 @@ async def test_zai_thinking_enabled_omits_boolean_thinking_field():
 
     kwargs = client.client.chat.completions.create.call_args.kwargs
     assert kwargs["extra_body"] == {"think": True}
+
+
+@pytest.mark.asyncio
+async def test_leaked_think_tags_are_stripped_when_thinking_disabled():
+    client = _client_for("https://api.minimax.io/v1", enable_thinking=False)
+    client.client.chat.completions.create.return_value = ListAsyncStream(
+        [_content_chunk(c) for c in ["<think>", "a < b", "</think>", "x<think>y</think>z"]]
+    )
+
+    tokens = [
+        token
+        async for token in client.stream_chat([{"role": "user", "content": "hi"}])
+    ]
+
+    assert tokens == ["a < b", "xyz"]
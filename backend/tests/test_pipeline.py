@@ -0,0 +1,62 @@
+"""Tests for the RAG pipeline's token coalescing."""
+
+import asyncio
+
+import pytest
+
+from rag.pipeline import _coalesce_tokens
+
+
+async def _stream(tokens, delays=None, fail_after=None):
+    for i, token in enumerate(tokens):
+        if fail_after is not None and i == fail_after:
+            raise RuntimeError("stream failed")
+        if delays:
+            await asyncio.sleep(delays[i])
+        yield token
+
+
+async def _collect(gen):
+    return [piece async for piece in gen]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_flushes_full_batches() -> None:
+    tokens = [str(i % 10) for i in range(10)]
+    pieces = await _collect(_coalesce_tokens(_stream(tokens), 4, 10_000))
+    assert pieces == ["0123", "4567", "89"]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_flushes_on_deadline_during_a_pause() -> None:
+    """Buffered tokens go out when flush_ms passes, not when the next token arrives."""
+    received = []
+
+    async def consume():
+        async for piece in _coalesce_tokens(
+            _stream(["a", "b", "c"], delays=[0, 0, 0.5]), 16, 20
+        ):
+            received.append(piece)
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0.2)
+    assert received == ["ab"]
+    await task
+    assert received == ["ab", "c"]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_yields_buffered_tokens_before_an_error() -> None:
+    received = []
+    with pytest.raises(RuntimeError, match="stream failed"):
+        async for piece in _coalesce_tokens(
+            _stream(["a", "b", "c", "d"], fail_after=3), 16, 10_000
+        ):
+            received.append(piece)
+    assert received == ["abc"]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_batch_size_one_passes_tokens_through() -> None:
+    pieces = await _collect(_coalesce_tokens(_stream(["a", "b"]), 1, 25))
+    assert pieces == ["a", "b"]
@@ -0,0 +1,97 @@
+"""Tests for the retrieval query cache."""
+
+import dataclasses
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+import rag.retrieve as retrieve_module
+from config import settings
+from rag.retrieve import invalidate_included_chat_ids, retrieve
+
+
+@pytest.fixture(autouse=True)
+def _clear_query_cache():
+    retrieve_module.invalidate_query_cache()
+    yield
+    retrieve_module.invalidate_query_cache()
+
+
+def _embedding_for(text: str) -> list[float]:
+    # "cat" queries land next to each other, everything else far away
+    return [1.0, 0.0, 0.01] if "cat" in text else [0.0, 1.0, 0.0]
+
+
+@pytest.fixture
+def search():
+    calls = {"embed": 0, "search": 0}
+
+    async def fake_embed(text):
+        calls["embed"] += 1
+        return _embedding_for(text)
+
+    async def fake_retrieve_chunks(*args, **kwargs):
+        calls["search"] += 1
+        return [f"chunk-{calls['search']}"]
+
+    with patch.object(retrieve_module, "embed_query", fake_embed), patch.object(
+        retrieve_module, "retrieve_chunks", fake_retrieve_chunks
+    ), patch.object(
+        retrieve_module,
+        "get_included_chat_ids",
+        AsyncMock(return_value=frozenset({"chat-1"})),
+    ):
+        yield calls
+
+
+@pytest.mark.asyncio
+async def test_exact_repeat_skips_embedding_and_search(search) -> None:
+    first, _ = await retrieve("My cat", settings)
+    second, _ = await retrieve("  my   CAT ", settings)
+
+    assert first == second == ["chunk-1"]
+    assert search == {"embed": 1, "search": 1}
+
+
+@pytest.mark.asyncio
+async def test_similar_query_reuses_chunks_without_search(search) -> None:
+    await retrieve("my cat", settings)
+    chunks, _ = await retrieve("the cat?", settings)
+
+    assert chunks == ["chunk-1"]
+    assert search == {"embed": 2, "search": 1}
+
+
+@pytest.mark.asyncio
+async def test_similar_hit_keeps_source_entry_time(search) -> None:
+    await retrieve("my cat", settings)
+    source_time = next(iter(retrieve_module._query_cache.values()))[0]
+    await retrieve("the cat?", settings)
+
+    assert [entry[0] for entry in retrieve_module._query_cache.values()] == [
+        source_time,
+        source_time,
+    ]
+
+
+@pytest.mark.asyncio
+async def test_date_range_and_top_k_are_isolated(search) -> None:
+    await retrieve("my cat", settings)
+    dated, _ = await retrieve("my cat november 2024", settings)
+    wider, _ = await retrieve(
+        "my cat", dataclasses.replace(settings, top_k=settings.top_k + 1)
+    )
+
+    assert dated == ["chunk-2"]
+    assert wider == ["chunk-3"]
+    assert search["search"] == 3
+
+
+@pytest.mark.asyncio
+async def test_invalidating_included_chats_clears_the_cache(search) -> None:
+    await retrieve("my cat", settings)
+    invalidate_included_chat_ids()
+    chunks, _ = await retrieve("my cat", settings)
+
+    assert chunks == ["chunk-2"]
+    assert search == {"embed": 2, "search": 2}
@@ -7,6 +7,7 @@ from pathlib import Path
 from typing import Optional
 
 import chromadb
+import numpy as np
 from chromadb.config import Settings as ChromaSettings
 from db.database import DATA_DIR
 from db.models import Chunk
@@ -50,17 +51,17 @@ def _get_collection() -> chromadb.Collection:
 
 def upsert(
     chunks: list[Chunk],
-    embeddings: list[list[float]],
+    embeddings: np.ndarray | list[list[float]],
     collection: Optional[chromadb.Collection] = None,
 ) -> None:
     """Insert or update chunks with their embeddings.
 
     Args:
         chunks: List of Chunk objects to upsert
-        embeddings: List of embedding vectors (one per chunk)
+        embeddings: Embedding vectors (one per chunk), as an array or lists
         collection: Optional collection to use. If None, uses the default collection.
     """
-    if not chunks or not embeddings:
+    if not chunks or len(embeddings) == 0:
         logger.warning("upsert called with empty chunks or embeddings")
         return
 
@@ -75,15 +76,17 @@ def upsert(
     ids = [chunk.chunk_id for chunk in chunks]
     documents = [chunk.content for chunk in chunks]
 
+    # participants is already a JSON list string (as stored in SQLite); it is
+    # passed through rather than parsed and re-serialized for every chunk.
+    # query() tolerates a malformed value by treating it as no participants.
     metadatas = []
     for chunk in chunks:
-        participants = chunk.get_participants_list()
         metadatas.append(
             {
                 "chunk_id": chunk.chunk_id,
                 "chat_id": chunk.chat_id,
                 "chat_name": chunk.chat_name or "",
-                "participants": json.dumps(participants),
+                "participants": chunk.participants or "[]",
                 "content_hash": chunk.content_hash or "",
                 "timestamp_start": chunk.timestamp_start,
                 "timestamp_end": chunk.timestamp_end,
@@ -328,6 +331,20 @@ def wipe() -> None:
     logger.info(f"Recreated ChromaDB collection '{COLLECTION_NAME}'")
 
 
+DELETE_BATCH_SIZE = 900  # Ids per delete(); stays under SQLite's 999 bound-variable limit
+
+
+def delete(chunk_ids: list[str]) -> None:
+    """Delete vectors by chunk id, in DELETE_BATCH_SIZE groups.
+
+    ChromaDB resolves the ids in its own SQLite store, so one huge call
+    risks the host-parameter limit and holds its write lock throughout.
+    """
+    collection = _get_collection()
+    for i in range(0, len(chunk_ids), DELETE_BATCH_SIZE):
+        collection.delete(ids=chunk_ids[i : i + DELETE_BATCH_SIZE])
+
+
 async def count() -> int:
     """Get the total number of vectors in the collection."""
     collection = _get_collection()
@@ -352,7 +369,8 @@ async def get_all_chunk_ids() -> set[str]:
         cnt = await asyncio.to_thread(collection.count)
         if cnt == 0:
             return set()
-        result = await asyncio.to_thread(collection.get, limit=cnt)
+        # ids are always returned; skip documents and metadata entirely
+        result = await asyncio.to_thread(collection.get, limit=cnt, include=[])
         return set(result.get("ids", []))
     except Exception as e:
         logger.warning(f"Could not get all chunk IDs from ChromaDB: {e}")